@@ -0,0 +1,195 @@
+"""
+Benchmarks of the hot paths: map generation, path carving, environment stepping and learning throughput.
+
+    python benchmarks/bench.py [--sizes 4 8 16] [--output results.json] [--baseline benchmarks/baseline.json]
+                               [--save-baseline] [--tolerance 0.2] [--seed 0]
+
+Results are written as JSON. Every benchmark draws its maps and actions from the seed, so two runs measure the same
+work. When a baseline exists, the rate of each result (maps, paths, dungeons, steps, updates or episodes per second)
+is compared to it and the run fails if one of them is lower than the baseline by more than the tolerance. Baselines
+depend on the machine, so none is committed: save one with --save-baseline before comparing.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [_root, os.path.join(_root, "gdm", "env")]
+
+from gdm import DungeonMaps  # noqa: E402
+from gdm.maps.base import Maps  # noqa: E402
+from gdm.rl.methods.qlearning import QTable, qlearning, evaluation  # noqa: E402
+from gdm.rl.tools import Policy  # noqa: E402
+from dungeon import Dungeon, _actions  # noqa: E402
+
+SIZES = (4, 8, 16, 32, 64, 128, 256, 512)
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+class _CountingDungeon:
+    """Dungeon on a fixed map counting its steps, as used by 'qlearning' and 'evaluation'"""
+
+    def __init__(self, size, seed):
+        self.dungeon = Dungeon(DungeonMaps(size=size, seed=seed), reset_mode="same")
+        self.num_steps = 0
+
+    def reset(self):
+        return self.dungeon.reset()
+
+    def step(self, action):
+        self.num_steps += 1
+        state, reward, done = self.dungeon.fast_step(action)
+        return state, reward, done, {}
+
+
+def _timeit(function, min_time=0.2, max_repeat=50):
+    """Best time of 'function' over repeated calls, for at least 'min_time' seconds"""
+    times = []
+    began = time.perf_counter()
+    while len(times) < max_repeat and (not times or time.perf_counter() - began < min_time):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def _rate(result: dict) -> float:
+    """Number of operations per second of a result"""
+    return next(value for key, value in result.items() if key.endswith("_per_second"))
+
+
+def bench_map_construction(size, seed):
+    # one generator for all the repetitions: a run builds the same sequence of maps
+    rng = np.random.default_rng(seed)
+    seconds = _timeit(lambda: DungeonMaps(size=(size, size), seed=rng))
+    return {"seconds": seconds, "maps_per_second": 1 / seconds}
+
+
+def bench_random_path(size, seed):
+    _map = Maps(size=(size, size))
+    _map._rng = np.random.default_rng(seed)
+    seconds = _timeit(lambda: _map.random_path((0, 0), (size - 1, size - 1)))
+    return {"seconds": seconds, "paths_per_second": 1 / seconds}
+
+
+def bench_dungeon_construction(size, seed):
+    rng = np.random.default_rng(seed)
+    seconds = _timeit(lambda: len(Dungeon(DungeonMaps(size=(size, size), seed=rng)).states))
+    return {"seconds": seconds, "dungeons_per_second": 1 / seconds}
+
+
+def bench_dungeon_step(size, seed, num_steps=2000):
+    dungeon = Dungeon(DungeonMaps(size=(size, size), seed=seed), reset_mode="same")
+    actions = [_actions[i] for i in np.random.randint(0, len(_actions), num_steps)]
+    seconds = _timeit(lambda: [dungeon.step(action) for action in actions])
+    return {"seconds": seconds, "steps_per_second": num_steps / seconds}
+
+
+def bench_dungeon_fast_step(size, seed, num_steps=20000):
+    dungeon = Dungeon(DungeonMaps(size=(size, size), seed=seed), reset_mode="same")
+    actions = np.random.randint(0, len(_actions), num_steps).tolist()
+    seconds = _timeit(lambda: [dungeon.fast_step(action) for action in actions])
+    return {"seconds": seconds, "steps_per_second": num_steps / seconds}
+
+
+def bench_qlearning(size, seed, num_episodes=20, time_limit=200):
+    env = _CountingDungeon((size, size), seed)
+    q = QTable(len(env.dungeon.states), len(_actions), alpha=0.1)
+    policy = Policy(0.2, q)
+    start = time.perf_counter()
+    qlearning(env, q, policy, num_episodes=num_episodes, time_limit=time_limit,
+              eval_frequency=num_episodes + 1, snapshot_frequency=num_episodes + 1)
+    seconds = time.perf_counter() - start
+    # one update per step
+    return {"seconds": seconds, "updates_per_second": env.num_steps / seconds}
+
+
+def bench_evaluation(size, seed, num_episodes=20, time_limit=100):
+    env = _CountingDungeon((size, size), seed)
+    policy = Policy(1., QTable(len(env.dungeon.states), len(_actions), alpha=0.1))
+    seconds = _timeit(lambda: evaluation(policy, env, num_episodes=num_episodes, time_limit=time_limit), max_repeat=3)
+    return {"seconds": seconds, "episodes_per_second": num_episodes / seconds}
+
+
+# benchmark -> largest size it runs on. The Q-table has (n * m) ** 3 rows.
+BENCHMARKS = {
+    "map_construction": (bench_map_construction, 512),
+    "random_path": (bench_random_path, 512),
+    "dungeon_construction": (bench_dungeon_construction, 512),
+    "dungeon_step": (bench_dungeon_step, 512),
+    "dungeon_fast_step": (bench_dungeon_fast_step, 512),
+    "qlearning": (bench_qlearning, 8),
+    "evaluation": (bench_evaluation, 8),
+}
+
+
+def run(sizes=SIZES, names=None, seed: int = 0) -> dict:
+    results = {}
+    for name, (benchmark, max_size) in BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        for size in sizes:
+            if size > max_size:
+                continue
+            key = f"{name}[{size}x{size}]"
+            # the policies and the random actions draw from the global generator
+            np.random.seed(seed)
+            results[key] = benchmark(size, seed)
+            print(f"{key}: {results[key]['seconds']:.6f} s, {_rate(results[key]):.1f} /s")
+    return {"meta": {"python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+                     "processor": platform.processor(), "date": datetime.now(timezone.utc).isoformat(),
+                     "seed": seed},
+            "results": results}
+
+
+def compare(report: dict, baseline: dict, tolerance: float = 0.2) -> dict:
+    """
+    Ratio of the baseline rate of each result to its rate, and the results slower than the baseline by more than
+        'tolerance'. Rates rather than raw times, since some benchmarks do not run a fixed amount of work.
+    """
+    ratios = {key: _rate(baseline["results"][key]) / _rate(result)
+              for key, result in report["results"].items() if key in baseline["results"]}
+    return {"ratios": ratios, "regressions": sorted(key for key, ratio in ratios.items() if ratio > 1 + tolerance)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--benchmarks", nargs="+", choices=list(BENCHMARKS), default=None)
+    parser.add_argument("--output", default=None, help="JSON file of the results, printed when not given")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0, help="seed of the maps and of the random actions")
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.benchmarks, args.seed)
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as file:
+            report["comparison"] = compare(report, json.load(file), args.tolerance)
+    elif not args.save_baseline:
+        print(f"Warning: no baseline at {args.baseline}, nothing is compared. "
+              f"Save one on this machine with --save-baseline.", file=sys.stderr)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(report, file, indent=2)
+    regressions = report.get("comparison", {}).get("regressions")
+    if regressions:
+        print(f"Regressions over {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
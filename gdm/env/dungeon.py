@@ -1,34 +1,200 @@
+from collections.abc import Mapping
+from functools import lru_cache
 from math import inf
 import sys
 
+import numpy as np
+
 try:
     from gdm import DungeonMaps
 except ModuleNotFoundError:
     sys.path.append("C:\\Users\\elton\\Desktop\\generative-dungeon-maps")
     from gdm import DungeonMaps
+from gdm.maps.base import _chars_to_str
+from gdm.maps.cache import artifacts
+from gdm.maps.pool import MapPool
+from gdm.profiling import profiled
 
 from base import Env, action_type
 from typing import Tuple
 
 Coord = Tuple[int, int]
 
+# Integer code of each action, as used for a manual play
+_actions = ("exit", "left", "down", "right", "collect", "top")
+_EXIT, _LEFT, _DOWN, _RIGHT, _COLLECT, _TOP = range(len(_actions))
+_action_codes = {action: code for code, action in enumerate(_actions)}
+_shift_codes = frozenset([_LEFT, _DOWN, _RIGHT, _TOP])
+_EXIT_BIT, _COLLECT_BIT = 1 << _EXIT, 1 << _COLLECT
+# Map of a new episode: the current one, one built on the spot, the next one of an unseeded or of a seeded pool
+_reset_modes = ("same", "new", "pool", "sequence")
+# Boolean mask of the actions of each bitmask of legal actions
+_action_masks = (np.arange(1 << len(_actions))[:, None] >> np.arange(len(_actions)) & 1).astype(bool)
+
+
+def _shifts(m: int) -> np.ndarray:
+    """Shift of the agent's flat location for each action code, in a map of width 'm'"""
+    shifts = np.zeros(len(_actions), dtype=np.intp)
+    shifts[[_LEFT, _DOWN, _RIGHT, _TOP]] = -1, m, 1, -m
+    return shifts
+
+
+def _legal_moves(blocked_moves: np.ndarray) -> np.ndarray:
+    """
+    Bitmask of the legal shift actions in each box: bit 'a' is set when the action of code 'a' is not blocked by a wall
+    :param blocked_moves: boolean array of shape (..., n, m, 4) as returned by 'Maps.blocked_moves'
+    :return: uint8 array of shape (..., n, m)
+    """
+    top, down, left, right = np.moveaxis(~blocked_moves, -1, 0).astype(np.uint8)
+    return (top << _TOP) | (down << _DOWN) | (left << _LEFT) | (right << _RIGHT)
+
+
+def _prepare_map(_map) -> Tuple[np.ndarray, list]:
+    """
+    The O(n * m) tables of a map, built by the background thread of a map pool so that a reset only swaps them in
+    :return: the legal moves of the map and the same as a flat list, see 'Dungeon._set_fast_tables'
+    """
+    legal_moves = _legal_moves(_map.blocked_moves())
+    return legal_moves, legal_moves.ravel().tolist()
+
+
+def _num_states(size: Tuple[int, int]) -> int:
+    """
+    The valid states are indexed with a mixed radix over the agent, treasure and exit locations and the collected flag:
+        - treasure not collected (treasure and exit locations differ): ((agent * N + treasure) * (N - 1) + exit')
+            where exit' skips the treasure location
+        - treasure collected (treasure and agent locations coincide): N ** 2 * (N - 1) + agent * N + exit
+    with N = n * m the number of boxes, which makes N ** 3 states.
+    """
+    n, m = size
+    return (n * m) ** 3
+
+
+def encode_states(agent_locations, treasure_locations, exit_locations, treasure_collected,
+                  size: Tuple[int, int]) -> np.ndarray:
+    """
+    Vectorized state encoder over flat box indices (x * m + y)
+    :return: the state indices
+    """
+    n, m = size
+    num_boxes = n * m
+    agent_locations = np.asarray(agent_locations)
+    treasure_locations = np.asarray(treasure_locations)
+    exit_locations = np.asarray(exit_locations)
+    not_collected = ((agent_locations * num_boxes + treasure_locations) * (num_boxes - 1)
+                     + exit_locations - (exit_locations > treasure_locations))
+    collected = num_boxes ** 2 * (num_boxes - 1) + agent_locations * num_boxes + exit_locations
+    return np.where(treasure_collected, collected, not_collected)
+
+
+def decode_states(codes, size: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Vectorized state decoder, inverse of 'encode_states'
+    :return: the flat agent, treasure and exit locations and the collected flags
+    """
+    n, m = size
+    num_boxes = n * m
+    codes = np.asarray(codes)
+    treasure_collected = codes >= num_boxes ** 2 * (num_boxes - 1)
+    # treasure not collected
+    exit_locations, agent_treasure = np.divmod(codes, num_boxes - 1)[::-1]
+    agent_locations, treasure_locations = np.divmod(agent_treasure, num_boxes)
+    exit_locations = exit_locations + (exit_locations >= treasure_locations)
+    # treasure collected
+    collected_agent, collected_exit = np.divmod(codes - num_boxes ** 2 * (num_boxes - 1), num_boxes)
+    agent_locations = np.where(treasure_collected, collected_agent, agent_locations)
+    treasure_locations = np.where(treasure_collected, collected_agent, treasure_locations)
+    exit_locations = np.where(treasure_collected, collected_exit, exit_locations)
+    return agent_locations, treasure_locations, exit_locations, treasure_collected
+
 
 def _state_encoder(agent_location: Coord,
                    treasure_location: Coord,
                    exit_location: Coord,
-                   treasure_collected: bool) -> str:
-    state = agent_location + treasure_location + exit_location + (int(treasure_collected), )
-    return "".join(map(str, state))
+                   treasure_collected: bool,
+                   size: Tuple[int, int]) -> int:
+    m = size[1]
+    agent_location, treasure_location, exit_location = (x * m + y for x, y in
+                                                        (agent_location, treasure_location, exit_location))
+    return int(encode_states(agent_location, treasure_location, exit_location, treasure_collected, size))
+
+
+def _state_decoder(code: int, size: Tuple[int, int]):
+    assert 0 <= code < _num_states(size)
+    m = size[1]
+    agent_location, treasure_location, exit_location, treasure_collected = map(int, decode_states(code, size))
+    return {"agent_location": divmod(agent_location, m), "treasure_location": divmod(treasure_location, m),
+            "exit_location": divmod(exit_location, m), "treasure_collected": treasure_collected, "code": code}
 
 
-def _state_decoder(code: str):
-    assert type(code) == str and len(code) == 7
-    agent_location = (int(code[0]), int(code[1]))
-    treasure_location = (int(code[2]), int(code[3]))
-    exit_location = (int(code[4]), int(code[5]))
-    treasure_collected = int(code[6])
-    return {"agent_location": agent_location, "treasure_location": treasure_location,
-            "exit_location": exit_location, "treasure_collected": treasure_collected, "code": code}
+def _state_action_masks(legal_moves: np.ndarray, states, size: Tuple[int, int]) -> np.ndarray:
+    """Boolean masks of the legal actions of the states of indices 'states', given the legal moves table of the map"""
+    agent_location, _, _, collected = decode_states(states, size)
+    return _action_masks[legal_moves.flat[agent_location] | (1 << np.where(collected, _EXIT, _COLLECT))]
+
+
+def _transition_model(legal_moves: np.ndarray, size: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Deterministic model of a dungeon over the whole state space, built on arrays with the rules of 'Dungeon._reward'
+        and 'Dungeon._gain_adjustment'. The timeout is not part of the state, so a successful exit is assumed to happen
+        before it.
+    :param legal_moves: legal moves table of the map, see '_legal_moves'
+    :param size:
+    :return: the next states, the rewards and the done flags, each of shape (num_states, num_actions)
+    """
+    states = np.arange(_num_states(size))
+    agent_location, treasure_location, exit_location, collected = decode_states(states, size)
+    legal = _state_action_masks(legal_moves, states, size)
+    codes = np.arange(len(_actions))
+    is_shift = np.isin(codes, list(_shift_codes))
+
+    next_location = np.where(legal & is_shift, agent_location[:, None] + _shifts(size[1]), agent_location[:, None])
+    found = ~collected[:, None] & (next_location == treasure_location[:, None])
+    on_treasure = (agent_location == treasure_location)[:, None]
+    on_exit = (agent_location == exit_location)[:, None]
+    rewards = np.select([is_shift, codes == _COLLECT, codes == _EXIT],
+                        [np.where(found, 3, 1), np.where(on_treasure, 3, -5), np.where(on_exit, 3 + 10, -5)])
+    rewards = np.where(legal, rewards, -10)
+    dones = legal & (codes == _EXIT) & on_exit
+
+    next_collected = collected[:, None] | (legal & (codes == _COLLECT) & on_treasure)
+    next_treasure_location = np.where(next_collected, next_location, treasure_location[:, None])
+    next_states = encode_states(next_location, next_treasure_location, exit_location[:, None], next_collected, size)
+    return next_states, rewards, dones
+
+
+class StateSpace(Mapping):
+    """
+    Lazy mapping from the state indices of a map of size 'size' to the decoded states.
+    Nothing is materialised: lookups and iteration decode the indices on the fly.
+    """
+
+    def __init__(self, size: Tuple[int, int]):
+        self.size = size
+        self._num_states = _num_states(size)
+
+    def __len__(self) -> int:
+        return self._num_states
+
+    def __iter__(self):
+        return iter(range(self._num_states))
+
+    def __contains__(self, code) -> bool:
+        return isinstance(code, (int, np.integer)) and 0 <= code < self._num_states
+
+    def __getitem__(self, code: int) -> dict:
+        if code not in self:
+            raise KeyError(code)
+        return _state_decoder(code, self.size)
+
+    def index(self, state: dict) -> int:
+        return _state_encoder(state["agent_location"], state["treasure_location"], state["exit_location"],
+                              state["treasure_collected"], self.size)
+
+
+@lru_cache(maxsize=None)
+def _state_space(size: Tuple[int, int]) -> StateSpace:
+    return StateSpace(size)
 
 
 def _select_action(code: int):
@@ -63,71 +229,172 @@ class Dungeon(Env):
 
     """
 
-    def __init__(self, _map: DungeonMaps = None, timeout=inf, size: Tuple[int, int] = (4, 4)):
+    def __init__(self, _map: DungeonMaps = None, timeout=inf, size: Tuple[int, int] = (4, 4),
+                 reset_mode: str = "new", seed=None, pool_size: int = 64):
         """
 
         :param _map:
         :param timeout:
         :param size:
+        :param reset_mode: default mode of 'reset', one of "same", "new", "pool" and "sequence"
+        :param seed: master seed of the map sequence of the "sequence" mode
+        :param pool_size: number of maps prepared in advance by the "pool" and "sequence" modes
         """
+        if reset_mode not in _reset_modes:
+            raise ValueError(f"Unknown reset mode '{reset_mode}', expected one of {_reset_modes}")
         super().__init__()
+        self._reset_mode = reset_mode
+        self._seed = seed
+        self._pool_size = pool_size
+        self._pools = {}
+        self._reset_counts = {mode: {"hits": 0, "misses": 0} for mode in ("same", "new")}
+        self._frame = None
+        self._frame_map = None
+        self._patches = {}
+        self._shown = None
+        self._shown_map = None
         if _map:
-            self._map = _map
+            self._set_map(_map)
         else:
-            self._map = DungeonMaps()
-        self._restart(timeout=timeout)
-        self.actions = {i: action for i, action in enumerate(self._actions_space)}
-        self.states = {i: _state_decoder(state) for i, state in enumerate(self._states_space)}
+            self._set_map(DungeonMaps(size=size), cache=False)
+        self._restart(keep_init_conditions=True, timeout=timeout)
+        self.actions = {i: action for i, action in enumerate(_actions)}
+        self.states = self._states_space
 
     def _restart(self, keep_init_conditions: bool = False, timeout=inf):
-        if keep_init_conditions:
-            raise NotImplementedError
+        self._timeout = timeout
+        self.reset("same" if keep_init_conditions else "new")
+
+    def reset(self, mode: str = None) -> int:
+        """
+        Start a new episode. Apart from the "new" mode, the map is ready and the reset is O(1).
+        :param mode: how the map of the episode is chosen, the reset mode of the dungeon when None:
+            - "same": the current map
+            - "new": a map built on the spot
+            - "pool": the next map of a pool refilled by a background thread
+            - "sequence": the next map of the sequence seeded with 'seed', also prepared in the background
+        :return: the initial state index
+        """
+        mode = mode or self._reset_mode
+        if mode == "same":
+            self._reset_counts[mode]["hits"] += 1
+        elif mode == "new":
+            self._reset_counts[mode]["misses"] += 1
+            self._set_map(DungeonMaps(size=self._map.size), cache=False)
+        elif mode in _reset_modes:
+            _map, (legal_moves, fast_legal_moves) = self._map_pool(mode).get()
+            self._set_map(_map, legal_moves, fast_legal_moves=fast_legal_moves)
         else:
-            self._map = DungeonMaps(size=self._map.size)
+            raise ValueError(f"Unknown reset mode '{mode}', expected one of {_reset_modes}")
         self._current_location: Coord = self._map.starting_point
         self._collected: bool = False
         self._time: int = 0
-        self._timeout = timeout
+        return self._state_code()
+
+    def _map_pool(self, mode: str) -> MapPool:
+        pool = self._pools.get(mode)
+        if pool is None:
+            pool = self._pools[mode] = MapPool(self._map.size, self._pool_size,
+                                               seed=self._seed if mode == "sequence" else None,
+                                               prepare=_prepare_map)
+        return pool
+
+    def reset_stats(self) -> dict:
+        """
+        Hits (map ready) and misses (map built or waited for) of each reset mode used so far
+        """
+        stats = {mode: dict(counts) for mode, counts in self._reset_counts.items()}
+        stats.update({mode: {"hits": pool.hits, "misses": pool.misses} for mode, pool in self._pools.items()})
+        return stats
+
+    def close(self):
+        """Stop the background threads of the map pools"""
+        for pool in self._pools.values():
+            pool.close()
+        self._pools.clear()
+
+    def _set_map(self, _map: DungeonMaps, legal_moves: np.ndarray = None, cache: bool = True,
+                 fast_legal_moves: list = None):
+        """
+        :param _map:
+        :param legal_moves: the legal moves of the map when they are already known
+        :param cache: whether the artifacts of the map go through the shared cache. A map built on the spot is never
+            seen again, so caching it would only evict the artifacts of the maps that are reused.
+        :param fast_legal_moves: the legal moves as a flat list when already known, see '_prepare_map'
+        """
+        self._map = _map
+        self._cache_artifacts = cache
+        if legal_moves is None:
+            if cache:
+                legal_moves = artifacts.get_or_compute(_map, "legal_moves",
+                                                       lambda _map: _legal_moves(_map.blocked_moves()))
+            else:
+                legal_moves = _legal_moves(_map.blocked_moves())
+        self._legal_moves = legal_moves
+        self._set_fast_tables(fast_legal_moves)
+
+    def _set_fast_tables(self, fast_legal_moves: list = None):
+        """
+        Plain python tables of the current map used by 'fast_step': the legal moves and the flat locations of the boxes,
+            the flat offset of each action and the terms of the state index, see '_num_states'.
+        Apart from the list of the legal moves, which is O(n * m) to build unless given, the tables are O(1).
+        """
+        n, m = self._map.size
+        num_boxes = n * m
+        treasure = self._map.treasure_point[0] * m + self._map.treasure_point[1]
+        exit_location = self._map.ending_point[0] * m + self._map.ending_point[1]
+        self._m = m
+        if fast_legal_moves is None:
+            fast_legal_moves = self._legal_moves.ravel().tolist()
+        self._fast_legal_moves = fast_legal_moves
+        self._treasure_position = treasure
+        self._exit_position = exit_location
+        self._offsets = tuple({_LEFT: -1, _DOWN: m, _RIGHT: 1, _TOP: -m}.get(code, 0) for code in range(len(_actions)))
+        self._num_boxes = num_boxes
+        self._stride = num_boxes * (num_boxes - 1)
+        self._offset = treasure * (num_boxes - 1) + exit_location - (exit_location > treasure)
+        self._collected_offset = num_boxes ** 2 * (num_boxes - 1) + exit_location
+
+    @property
+    def _current_location(self) -> Coord:
+        return divmod(self._position, self._m)
+
+    @_current_location.setter
+    def _current_location(self, location: Coord):
+        self._position = location[0] * self._m + location[1]
+
+    def _state_code(self) -> int:
+        if self._collected:
+            return self._collected_offset + self._position * self._num_boxes
+        return self._position * self._stride + self._offset
 
     @property
     def _actions_space(self) -> frozenset:
         return frozenset(["left", "right", "top", "down", "collect", "exit"])
 
     @property
-    def _states_space(self) -> frozenset:
+    def _states_space(self) -> StateSpace:
         """
         Impossible states:
             - Case when the treasure is not collected yet: The treasure location and the exit location coincide
             - Case when the treasure is already collected: The treasure location and the agent's location don't coincide
         Construction:
-            ____________________________________________________________________________________________________________
+            Dense integer index over the valid states only, see '_num_states'. The space is lazy and shared by all
+            the dungeons of the same size.
         Notes:
             - The treasure can only be collected if its location coincides with that of the agent.
             - The treasure location and the agent's location may coincide without the agent having collected
                 the treasure yet: The next action in this state should ideally be to collect.
         """
 
-        n, m = self._map.size
-        location_space = [(i, j) for i in range(n) for j in range(m)]
-        states_space = []
-        for agent_location in location_space:
-            for treasure_location in location_space:
-                for output_location in location_space:
-                    # Treasure is not collected yet
-                    if treasure_location != output_location:
-                        states_space.append(_state_encoder(agent_location, treasure_location, output_location, False))
-                    # Treasure is already collected
-                    if treasure_location == agent_location:
-                        states_space.append(_state_encoder(agent_location, treasure_location, output_location, True))
-
-        return frozenset(states_space)
+        return _state_space(self._map.size)
 
     @property
     def state(self) -> dict:
         state = {"agent_location": self._current_location, "treasure_location": None,
                  "exit_location": self._map.ending_point, "treasure_collected": self._collected}
         state["treasure_location"] = self._map.treasure_point if not self._collected else state["agent_location"]
-        state.update({"code": _state_encoder(**state)})
+        state.update({"code": self._state_code()})
         return state
 
     @property
@@ -171,46 +438,46 @@ class Dungeon(Env):
     def _exit(self) -> bool:
         return self._current_location == self._map.ending_point
 
+    @profiled("dungeon.step")
     def step(self, action: str):
         assert action in self._actions_space
-        action = self.__getattribute__('_' + action)
-        info = {}
-        done = False
-        reward = self._reward(action)
-        if action not in self._get_possible_actions():
-            return self.state, reward, done, info
-        elif action in {self._left, self._right, self._top, self._down}:
-            self._current_location = action()
-        elif action == self._collect:
-            self._collected = self._collect()
-        elif action == self._exit:
-            if self._exit():
-                done = True
-                reward += self._gain_adjustment()
-
-        return self.state, reward, done, info
+        _, reward, done = self.fast_step(_action_codes[action])
+        return self.state, int(reward), done, {}
 
-    def _reward(self, action) -> int:
+    def fast_step(self, action: int) -> Tuple[int, float, bool]:
+        """
+        Step on integer codes only: no dict, string or bound method is built. An illegal action costs 10, a failed
+            collect or exit 5, and a move 1 or 3 when it reaches the treasure not yet collected. A successful collect
+            gives 3, and a successful exit 3 plus '_gain_adjustment'.
+        :param action: action code, see '_actions'
+        :return: the next state index, the reward and whether the game is over
+        """
         self._time += 1
-        possible_actions = self._get_possible_actions()
-        if action not in possible_actions:
-            return -10
-        elif action in {self._left, self._right, self._top, self._down}:  # shift action
-            next_location = action()
-            if self.state.get("treasure_location") == next_location:
-                return +3
-            else:
-                return +1
-        elif action == self._collect:
-            if self._collect():
-                return +3
+        position = self._position
+        collected = self._collected
+        done = False
+        if not (self._fast_legal_moves[position] | (_EXIT_BIT if collected else _COLLECT_BIT)) >> action & 1:
+            reward = -10.
+        elif action == _COLLECT:
+            if position == self._treasure_position:
+                self._collected = collected = True
+                reward = 3.
             else:
-                return -5
-        elif action == self._exit:
-            if self._exit():
-                return 3
+                reward = -5.
+        elif action == _EXIT:
+            if position == self._exit_position:
+                done = True
+                reward = 3. + self._gain_adjustment()
             else:
-                return -5
+                reward = -5.
+        else:
+            position += self._offsets[action]
+            self._position = position
+            reward = 3. if not collected and position == self._treasure_position else 1.
+
+        if collected:
+            return self._collected_offset + position * self._num_boxes, reward, done
+        return position * self._stride + self._offset, reward, done
 
     def _gain_adjustment(self) -> int:
         # this must be called directly at the end of the game
@@ -222,45 +489,93 @@ class Dungeon(Env):
 
         return reward
 
-    def _get_possible_actions(self):
-        possible_actions = set()
-        observation = self.observation
-
-        if not observation["top"][-1]:
-            possible_actions.add(self._top)
-        if not observation["down"][-1]:
-            possible_actions.add(self._down)
-        if not observation["right"][-1]:
-            possible_actions.add(self._right)
-        if not observation["left"][-1]:
-            possible_actions.add(self._left)
-
-        # The agent cannot exit if the treasure is not yet collected
-        # The agent should no longer attempt to collect something if the treasure is already collected
-        if not observation["treasure"]:
-            possible_actions.add(self._collect)
-        else:
-            possible_actions.add(self._exit)
+    def legal_actions(self) -> int:
+        """
+        Bitmask of the legal actions in the current state: bit 'a' is set when the action of code 'a' is legal.
+        The shift actions come from the per-box table computed once per map.
+        The agent cannot exit if the treasure is not yet collected, and should no longer attempt to collect
+            something once the treasure is collected.
+        """
+        return self._fast_legal_moves[self._position] | (_EXIT_BIT if self._collected else _COLLECT_BIT)
 
-        return possible_actions
+    def action_mask(self, state=None) -> np.ndarray:
+        """
+        Boolean mask of the legal actions, indexed by action code
+        :param state: state index or array of state indices in the current map, the current state when None
+        :return: array of shape (..., 6)
+        """
+        if state is None:
+            return _action_masks[self.legal_actions()]
+        return _state_action_masks(self._legal_moves, state, self._map.size)
 
-    def __str__(self):
-        n, m = self._map.size
+    def transition_model(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Deterministic model of the dungeon on its current map over the whole state space, see '_transition_model'
+        :return: the next states, the rewards and the done flags, each of shape (num_states, num_actions)
+        """
+        return _transition_model(self._legal_moves, self._map.size)
 
-        def location_to_index(i, j):
-            return ((4 * m + 2) * (2 * (i + 1) - 1)) + 4 * (j + 1) - 1
+    def _get_possible_actions(self):
+        legal_actions = self.legal_actions()
+        return {self.__getattribute__('_' + action) for code, action in enumerate(_actions)
+                if legal_actions >> code & 1}
 
-        x, y = self._current_location
-        index = location_to_index(x, y)
-        map_ = ''
-        for i, c in enumerate(repr(self._map)):
-            if i == index:
-                map_ += "#"
-            elif self._collected and c == "T":
-                map_ += " "
+    def __str__(self):
+        return _chars_to_str(self._render_frame())
+
+    def _render_frame(self) -> np.ndarray:
+        """
+        Char array of the current frame. The static layer of the map is rendered once per map, then only the cells of
+            the agent and of the treasure are patched between frames.
+        """
+        if self._frame_map is not self._map:
+            if self._cache_artifacts:
+                self._frame = artifacts.get_or_compute(self._map, "render_chars",
+                                                       lambda _map: _map._render_chars()).copy()
             else:
-                map_ += c
-        return map_
+                self._frame = self._map._render_chars()
+            self._frame_map = self._map
+            self._patches = {}
+        for cell, char in self._patches.items():
+            self._frame[cell] = char
+        self._patches = {}
+
+        def cell_of(location: Coord) -> Coord:
+            x, y = location
+            return 2 * x + 1, 2 * (2 * y + 1)
+
+        if self._collected:
+            self._patch(cell_of(self._map.treasure_point), " ")
+        self._patch(cell_of(self._current_location), "#")
+        return self._frame
+
+    def _patch(self, cell: Coord, char: str):
+        self._patches.setdefault(cell, self._frame[cell])
+        self._frame[cell] = char
+
+    def render(self, ansi: bool = False, stream=sys.stdout):
+        """
+        Write the current frame to 'stream'.
+        :param ansi: only write the cells that changed since the previous frame, using ANSI cursor moves.
+            The whole frame is drawn on the first call and after a change of map.
+        :param stream:
+        :return:
+        """
+        frame = self._render_frame()
+        if not ansi:
+            stream.write(_chars_to_str(frame) + "\n")
+        elif self._shown is None or self._shown.shape != frame.shape or self._shown_map is not self._map:
+            stream.write("\x1b[H\x1b[2J" + _chars_to_str(frame)[1:] + "\n")
+        else:
+            # with the default tab stops, the char of column 'j' of the frame is on the terminal column 4 * j + 1
+            rows, columns = np.nonzero(frame != self._shown)
+            stream.write("".join(f"\x1b[{i + 1};{4 * j + 1}H{frame[i, j]}"
+                                 for i, j in zip(rows.tolist(), columns.tolist())))
+            stream.write(f"\x1b[{frame.shape[0] + 1};1H")
+        stream.flush()
+        if ansi:
+            self._shown = frame.copy()
+            self._shown_map = self._map
 
     def manual_play(self):
         import os
@@ -0,0 +1,65 @@
+from typing import NamedTuple, Tuple
+
+import numpy as np
+
+from dungeon import _actions, _legal_moves, _transition_model
+from gdm import DungeonMaps
+from gdm.maps.cache import artifacts
+
+__all__ = ["CSRMatrix", "DungeonModel", "export_model"]
+
+
+class CSRMatrix(NamedTuple):
+    """Sparse matrix in compressed sparse row format, convertible to a scipy matrix when scipy is installed"""
+    indptr: np.ndarray
+    indices: np.ndarray
+    data: np.ndarray
+    shape: Tuple[int, int]
+
+    def __matmul__(self, vector: np.ndarray) -> np.ndarray:
+        rows = np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+        return np.bincount(rows, weights=self.data * vector[self.indices], minlength=self.shape[0])
+
+    def tocsr(self):
+        from scipy.sparse import csr_matrix
+        return csr_matrix((self.data, self.indices, self.indptr), shape=self.shape)
+
+    def toarray(self) -> np.ndarray:
+        array = np.zeros(self.shape, dtype=self.data.dtype)
+        array[np.repeat(np.arange(self.shape[0]), np.diff(self.indptr)), self.indices] = self.data
+        return array
+
+
+class DungeonModel(NamedTuple):
+    """
+    Model of a dungeon on a given map over the integer state space of 'Dungeon':
+        - transitions: one (num_states, num_states) transition matrix per action code. The transitions that end the
+            episode lead nowhere, so their rows are empty.
+        - rewards: (num_states, num_actions) rewards
+        - dones: (num_states, num_actions) flags of the transitions that end the episode
+    """
+    transitions: Tuple[CSRMatrix, ...]
+    rewards: np.ndarray
+    dones: np.ndarray
+
+
+def export_model(_map: DungeonMaps) -> DungeonModel:
+    """
+    Build the model of a dungeon on '_map' from the walls of its grid. The model is cached in 'artifacts' under the
+        content hash of the map, the walls of a map being fixed once it is built.
+    :param _map:
+    :return:
+    """
+    return artifacts.get_or_compute(_map, "model", _build_model)
+
+
+def _build_model(_map: DungeonMaps) -> DungeonModel:
+    next_states, rewards, dones = _transition_model(_legal_moves(_map.blocked_moves()), _map.size)
+    num_states = len(rewards)
+    transitions = []
+    for action in range(len(_actions)):
+        rows = ~dones[:, action]
+        indptr = np.concatenate([[0], np.cumsum(rows)])
+        indices = next_states[rows, action]
+        transitions.append(CSRMatrix(indptr, indices, np.ones(len(indices)), (num_states, num_states)))
+    return DungeonModel(tuple(transitions), rewards, dones)
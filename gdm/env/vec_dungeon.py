@@ -0,0 +1,109 @@
+from math import inf
+from typing import Tuple
+
+import numpy as np
+
+from dungeon import _actions, _legal_moves, _shifts, encode_states, _EXIT, _LEFT, _DOWN, _RIGHT, _COLLECT, _TOP
+from base import Env
+from gdm import DungeonMaps
+from gdm.maps.base import _blocked_moves
+
+_MOVES = np.array([_LEFT, _DOWN, _RIGHT, _TOP])
+
+
+class VecDungeon(Env):
+    """
+    B independent dungeons stepped at once. The maps are held as arrays (legal moves bitmask, keypoints) along with
+        the agents' locations, the collected flags and the timers. Locations are flat box indices.
+    The rewards follow the same rules as 'Dungeon._reward' and 'Dungeon._gain_adjustment', and a dungeon whose agent
+        exits is reset right away with a new map.
+    """
+
+    def __init__(self, num_envs: int, size: Tuple[int, int] = (4, 4), timeout=inf, seed=None):
+        """
+
+        :param num_envs:
+        :param size:
+        :param timeout:
+        :param seed: seed or numpy Generator of the maps
+        """
+        super().__init__()
+        self.num_envs = num_envs
+        self.size = size
+        self.actions = {i: action for i, action in enumerate(_actions)}
+        self._timeout = timeout
+        self._rng = np.random.default_rng(seed)
+        self._shifts = _shifts(size[1])
+        n, m = size
+        self._legal_moves = np.zeros((num_envs, n * m), dtype=np.uint8)
+        self._locations = np.zeros(num_envs, dtype=np.intp)
+        self._treasure_locations = np.zeros(num_envs, dtype=np.intp)
+        self._exit_locations = np.zeros(num_envs, dtype=np.intp)
+        self._collected = np.zeros(num_envs, dtype=bool)
+        self._time = np.zeros(num_envs, dtype=np.int64)
+        self._restart(np.arange(num_envs))
+
+    def _restart(self, envs: np.ndarray):
+        if not envs.size:
+            return
+        n, m = self.size
+        grids, keypoints = DungeonMaps.generate(len(envs), self.size, seed=self._rng)
+        starting_points, ending_points, treasure_points = np.moveaxis(keypoints[..., 0] * m + keypoints[..., 1], 1, 0)
+        self._legal_moves[envs] = _legal_moves(_blocked_moves(grids)).reshape(len(envs), n * m)
+        self._locations[envs] = starting_points
+        self._treasure_locations[envs] = treasure_points
+        self._exit_locations[envs] = ending_points
+        self._collected[envs] = False
+        self._time[envs] = 0
+
+    @property
+    def states(self) -> np.ndarray:
+        return encode_states(self._locations, self._treasure_locations, self._exit_locations, self._collected,
+                             self.size)
+
+    def reset(self, envs=None) -> np.ndarray:
+        """
+        :param envs: indices of the dungeons to reset, all of them when None
+        :return: the states of all the dungeons
+        """
+        self._restart(np.arange(self.num_envs) if envs is None else np.asarray(envs))
+        return self.states
+
+    def step(self, actions: np.ndarray):
+        """
+        :param actions: action codes of shape (B, )
+        :return: the states, rewards and dones of shape (B, ) and an info dict holding the states reached before the
+            automatic reset under 'terminal_states'
+        """
+        actions = np.asarray(actions)
+        envs = np.arange(self.num_envs)
+        self._time += 1
+
+        is_move = np.isin(actions, _MOVES)
+        is_collect = actions == _COLLECT
+        is_exit = actions == _EXIT
+        # the treasure can only be collected once, and the agent can only exit once it is collected
+        possible = np.where(is_move, ((self._legal_moves[envs, self._locations] >> actions) & 1).astype(bool),
+                            np.where(is_collect, ~self._collected, self._collected))
+        rewards = np.full(self.num_envs, -10.)
+
+        moved = possible & is_move
+        next_locations = self._locations + self._shifts[actions]
+        found = ~self._collected & (next_locations == self._treasure_locations)
+        rewards[moved] = np.where(found, 3, 1)[moved]
+        self._locations[moved] = next_locations[moved]
+
+        collecting = possible & is_collect
+        on_treasure = self._locations == self._treasure_locations
+        rewards[collecting] = np.where(on_treasure, 3, -5)[collecting]
+        self._collected |= collecting & on_treasure
+
+        exiting = possible & is_exit
+        on_exit = self._locations == self._exit_locations
+        rewards[exiting] = np.where(on_exit, 3, -5)[exiting]
+        dones = exiting & on_exit
+        rewards[dones] += np.where(self._time > self._timeout, -10, 10)[dones]
+
+        states = self.states
+        self._restart(np.flatnonzero(dones))
+        return self.states, rewards, dones, {"terminal_states": states}
@@ -1,12 +1,187 @@
 import numpy as np
-from random import choice
+from functools import lru_cache
 from typing import Tuple
 
+from gdm.maps.packed import PackedWalls
+
 _char_map = {-3: '+', -2: '—', -1: '|', 0: ' ', 1: 'I', 2: 'O', 3: 'T'}
+# lookup table of '_char_map', indexed by value + 3
+_char_table = np.array([_char_map[value] for value in range(-3, 4)])
 
 __all__ = ["Maps", "BoxCoordError", "KeypointError"]
 
 
+@lru_cache(maxsize=None)
+def _neighbour_index(size: Tuple[int, int]) -> np.ndarray:
+    """
+    Flat indices of the top, down, left and right neighbours of each box of a map of size 'size', -1 when outside.
+    :param size:
+    :return: read-only array of shape (n * m, 4)
+    """
+    n, m = size
+    index = np.arange(n * m).reshape(n, m)
+    neighbours = np.full((n, m, 4), -1)
+    neighbours[1:, :, 0] = index[:-1, :]
+    neighbours[:-1, :, 1] = index[1:, :]
+    neighbours[:, 1:, 2] = index[:, :-1]
+    neighbours[:, :-1, 3] = index[:, 1:]
+    neighbours = neighbours.reshape(n * m, 4)
+    neighbours.flags.writeable = False
+    return neighbours
+
+
+def _blocked_moves(grids: np.ndarray) -> np.ndarray:
+    """
+    Closed walls around each box of one or several dilated grids
+    :param grids: array of shape (..., 2n + 1, 2m + 1)
+    :return: boolean array of shape (..., n, m, 4), the last axis being the top, down, left and right walls
+    """
+    return np.stack([grids[..., :-1:2, 1::2], grids[..., 2::2, 1::2],
+                     grids[..., 1::2, :-1:2], grids[..., 1::2, 2::2]], axis=-1) != 0
+
+
+def _render_chars(grid: np.ndarray) -> np.ndarray:
+    """
+    Char array of the text rendering of a dilated grid: the chars of the grid interleaved with tabs, each row ending
+        with a newline instead of its last tab
+    :param grid:
+    :return: array of shape (2n + 1, 2 * (2m + 1))
+    """
+    chars = np.full((grid.shape[0], 2 * grid.shape[1]), '\t')
+    chars[:, ::2] = _char_table[grid + 3]
+    chars[:, -1] = '\n'
+    return chars
+
+
+def _chars_to_str(chars: np.ndarray) -> str:
+    """String of a char array built by '_render_chars', in the format of 'Maps.__repr__'"""
+    return "\n" + np.ascontiguousarray(chars).reshape(-1).view(f'<U{chars.size}').item()[:-1]
+
+
+def _open_neighbours(size: Tuple[int, int], blocked_moves: np.ndarray) -> np.ndarray:
+    """Same as '_neighbour_index' with -1 for the neighbours behind a closed wall"""
+    return np.where(blocked_moves.reshape(-1, 4), -1, _neighbour_index(size))
+
+
+def _bfs(open_neighbours: np.ndarray, sources: np.ndarray, num_sources: int = None) -> np.ndarray:
+    """
+    Breadth-first search expanding the whole frontier at once.
+    :param open_neighbours: see '_open_neighbours'
+    :param sources: flat indices of the sources
+    :param num_sources: when given, run one search per source instead of a single multi-source search
+    :return: the distances to every box, -1 when unreachable, of shape (n * m, ) or (num_sources, n * m)
+    """
+    num_boxes = len(open_neighbours)
+    sources = np.asarray(sources)
+    if num_sources is None:
+        searches = np.zeros(len(sources), dtype=np.intp)
+    else:
+        searches = np.arange(num_sources)
+    distances = np.full((1 if num_sources is None else num_sources, num_boxes), -1)
+    # the frontier is a set of (search, box) pairs, encoded as search * num_boxes + box
+    frontier = np.unique(searches * num_boxes + sources)
+    distances.flat[frontier] = 0
+    distance = 0
+    while frontier.size:
+        distance += 1
+        searches, boxes = np.divmod(frontier, num_boxes)
+        candidates = open_neighbours[boxes]
+        reached = candidates >= 0
+        candidates = (searches[:, None] * num_boxes + candidates)[reached]
+        frontier = np.unique(candidates[distances.flat[candidates] < 0])
+        distances.flat[frontier] = distance
+    return distances if num_sources is not None else distances[0]
+
+
+def _random_path(size: Tuple[int, int], startpoint: int, endpoint: int, rng: np.random.Generator) -> list:
+    """Walk of 'Maps.random_path' on flat indices"""
+    n, m = size
+    last_row = (n - 1) * m
+    current_point = startpoint
+    marked_points = bytearray(n * m)
+    marked_points[current_point] = 1
+    visited_points = [current_point]
+    # each step forward consumes one draw and there are at most n * m - 1 of them
+    draws = iter(rng.random(n * m).tolist())
+
+    while current_point != endpoint:
+        # the neighbours in the order of '_neighbour_index', computed in place rather than read from a table: the
+        # conversion of a whole table to python ints would cost as much as the walk itself on large maps
+        column = current_point % m
+        eligible_neighbours = [x for x in (current_point - m if current_point >= m else -1,
+                                           current_point + m if current_point < last_row else -1,
+                                           current_point - 1 if column else -1,
+                                           current_point + 1 if column < m - 1 else -1)
+                               if x >= 0 and not marked_points[x]]
+        if eligible_neighbours:
+            current_point = eligible_neighbours[int(next(draws) * len(eligible_neighbours))]
+            marked_points[current_point] = 1
+            visited_points.append(current_point)
+        else:
+            visited_points.pop(-1)
+            current_point = visited_points[-1]
+
+    return visited_points
+
+
+# Below this number of paths, the walks are faster one by one than in lockstep, whatever the size of the maps
+_LOCKSTEP_MIN_PATHS = 64
+
+
+def _random_paths(size: Tuple[int, int], startpoints: np.ndarray, endpoints: np.ndarray, rng: np.random.Generator):
+    """
+    Batched version of 'Maps.random_path': the walks of all the maps advance in lockstep, one push or pop per map
+    and per iteration. Points are flat indices.
+    A lockstep iteration has a fixed cost whatever the number of walks, so small batches of long walks are drawn one
+        by one with '_random_path' instead.
+    :param size:
+    :param startpoints: array of shape (N, )
+    :param endpoints: array of shape (N, )
+    :param rng:
+    :return: the paths as an array of shape (N, n * m) and their lengths as an array of shape (N, )
+    """
+    n, m = size
+    num_paths = len(startpoints)
+    paths = np.zeros((num_paths, n * m), dtype=np.intp)
+    if num_paths < _LOCKSTEP_MIN_PATHS:
+        lengths = np.zeros(num_paths, dtype=np.intp)
+        for i, (startpoint, endpoint) in enumerate(zip(startpoints.tolist(), endpoints.tolist())):
+            path = _random_path(size, startpoint, endpoint, rng)
+            paths[i, :len(path)] = path
+            lengths[i] = len(path)
+        return paths, lengths
+    neighbours = _neighbour_index(size)
+    rows = np.arange(num_paths)
+    paths[:, 0] = startpoints
+    lengths = np.ones(num_paths, dtype=np.intp)
+    marked_points = np.zeros((num_paths, n * m), dtype=bool)
+    marked_points[rows, startpoints] = True
+    current_points = np.array(startpoints, dtype=np.intp)
+    active = np.flatnonzero(current_points != endpoints)
+
+    while active.size:
+        candidates = neighbours[current_points[active]]
+        eligible = (candidates >= 0) & ~marked_points[active[:, None], candidates]
+        # a random eligible neighbour is the one with the highest random key
+        chosen = np.where(eligible, rng.random(candidates.shape), -1).argmax(axis=1)
+        has_eligible = eligible.any(axis=1)
+
+        forward = active[has_eligible]
+        next_points = candidates[has_eligible, chosen[has_eligible]]
+        marked_points[forward, next_points] = True
+        paths[forward, lengths[forward]] = next_points
+        lengths[forward] += 1
+        current_points[forward] = next_points
+
+        backward = active[~has_eligible]
+        lengths[backward] -= 1
+        current_points[backward] = paths[backward, lengths[backward] - 1]
+
+        active = active[current_points[active] != endpoints[active]]
+
+    return paths, lengths
+
+
 class Maps:
     """
 
@@ -17,6 +192,13 @@ class Maps:
         obj.size = (4, 4)
         obj.permanently_closed_walls = set()
         obj.permanently_open_walls = set()
+        obj._generator = None
+        obj._dense_grid = None
+        obj._box = None
+        obj._walls = None
+        obj._box_items = None
+        obj._distances = {}
+        obj._content_hash = None
         return obj
 
     def __init__(self, size: tuple = (4, 4)):
@@ -36,13 +218,14 @@ class Maps:
         return self.box[item]
 
     def __repr__(self):
-        repr_ = "\n".join([
-            '\t'.join([_char_map[value] for value in line]) for line in self._grid]
-        )
-        return "\n" + repr_
+        return _chars_to_str(self._render_chars())
+
+    def _render_chars(self) -> np.ndarray:
+        grid = self._dense_grid if self._walls is None else self._walls.to_grid(self._box_array())
+        return _render_chars(grid)
 
     def __contains__(self, coord):
-        n, m = self.box.shape
+        n, m = self.size
         x, y = coord
         try:
             x = int(x)
@@ -54,6 +237,91 @@ class Maps:
         except:
             BoxCoordError("Coordinates must be integers")
 
+    @property
+    def _grid(self) -> np.ndarray:
+        if self._walls is not None:
+            self.unpack()
+        return self._dense_grid
+
+    @_grid.setter
+    def _grid(self, grid: np.ndarray):
+        if self._walls is not None:
+            self.unpack()
+        self._dense_grid = grid
+        self._distances = {}
+        self._content_hash = None
+
+    @property
+    def box(self) -> np.ndarray:
+        if self._walls is not None:
+            self.unpack()
+        return self._box
+
+    @box.setter
+    def box(self, box: np.ndarray):
+        if self._walls is not None:
+            self.unpack()
+        self._box = box
+
+    @property
+    def _rng(self) -> np.random.Generator:
+        """Generator of the random draws of the map, an unseeded one is created on first use"""
+        if self._generator is None:
+            self._generator = np.random.default_rng()
+        return self._generator
+
+    @_rng.setter
+    def _rng(self, rng: np.random.Generator):
+        self._generator = rng
+
+    @property
+    def packed(self) -> bool:
+        return self._walls is not None
+
+    def pack(self):
+        """
+        Switch to the compact backend: the walls are kept as two packed bit arrays and the boxes as a dict of the
+            nonzero values. 'get_wall', 'get_walls_around' and 'wall_between' are served from the bit arrays, while
+            any access to the legacy '_grid' and 'box' arrays unpacks the map.
+        The cached distances and the random generator are dropped: the later random draws of the map, if any, come
+            from a new unseeded generator.
+        :return: the map itself
+        """
+        if self._walls is None:
+            self._walls = PackedWalls.from_grid(self._dense_grid)
+            self._box_items = {tuple(index): self._box[tuple(index)].item()
+                               for index in np.argwhere(self._box).tolist()}
+            self._dense_grid = None
+            self._box = None
+            self._distances = {}
+            self._generator = None
+        return self
+
+    def unpack(self):
+        """
+        Switch back to the dense int grid
+        :return: the map itself
+        """
+        if self._walls is not None:
+            self._box = self._box_array()
+            self._dense_grid = self._walls.to_grid(self._box)
+            self._walls = None
+            self._box_items = None
+        return self
+
+    def _box_array(self) -> np.ndarray:
+        if self._walls is None:
+            return self._box
+        box = np.zeros(self.size)
+        for index, value in self._box_items.items():
+            box[index] = value
+        return box
+
+    def _wall_value(self, wall_coord: Tuple[int, int]) -> int:
+        if self._walls is not None:
+            return self._walls.get_wall(wall_coord)
+        return self._dense_grid[wall_coord]
+
     def _key_dilatation(self, key):
         if type(key) == int:
             return self._int_dilatation(key)
@@ -121,7 +389,44 @@ class Maps:
 
     def get_wall(self, wall_coord):
         assert self._is_wall(wall_coord)
-        return self._grid[wall_coord]
+        return self._wall_value(wall_coord)
+
+    def blocked_moves(self) -> np.ndarray:
+        """
+        Closed walls around every box of the map
+        :return: boolean array of shape (n, m, 4), the last axis being the top, down, left and right walls
+        """
+        if self._walls is None:
+            return _blocked_moves(self._dense_grid)
+        horizontal = self._walls.horizontal_walls()
+        vertical = self._walls.vertical_walls()
+        return np.stack([horizontal[:-1], horizontal[1:], vertical[:, :-1], vertical[:, 1:]], axis=-1)
+
+    def distance_field(self, sources) -> np.ndarray:
+        """
+        Length of the shortest path from the nearest of 'sources' to every box. The fields are cached on the map,
+            whose walls are assumed fixed once built.
+        :param sources: box coordinates
+        :return: int array of shape (n, m), -1 for the unreachable boxes
+        """
+        n, m = self.size
+        key = frozenset(map(tuple, sources))
+        if key not in self._distances:
+            for point in key:
+                assert point in self
+            sources = [x * m + y for x, y in key]
+            self._distances[key] = _bfs(_open_neighbours(self.size, self.blocked_moves()), sources).reshape(n, m)
+        return self._distances[key]
+
+    def all_pairs_distances(self) -> np.ndarray:
+        """
+        Length of the shortest path between every pair of boxes, meant for small maps. Cached on the map.
+        :return: int array of shape (n * m, n * m) indexed by flat box indices (x * m + y), -1 when unreachable
+        """
+        if None not in self._distances:
+            n, m = self.size
+            self._distances[None] = _bfs(_open_neighbours(self.size, self.blocked_moves()), np.arange(n * m), n * m)
+        return self._distances[None]
 
     def get_walls_around(self, point: Tuple[int, int]):
         """
@@ -135,10 +440,10 @@ class Maps:
         y = self._int_dilatation(y)
         if not self._is_box((x, y)):
             raise BoxCoordError(f"({point}) doesn't match a box coordinate")
-        return {"top": ((x - 1, y), _char_map[self._grid[(x - 1, y)]].strip()),
-                "down": ((x + 1, y), _char_map[self._grid[(x + 1, y)]].strip()),
-                "left": ((x, y - 1), _char_map[self._grid[(x, y - 1)]].strip()),
-                "right": ((x, y + 1), _char_map[self._grid[(x, y + 1)]].strip()), }
+        return {"top": ((x - 1, y), _char_map[self._wall_value((x - 1, y))].strip()),
+                "down": ((x + 1, y), _char_map[self._wall_value((x + 1, y))].strip()),
+                "left": ((x, y - 1), _char_map[self._wall_value((x, y - 1))].strip()),
+                "right": ((x, y + 1), _char_map[self._wall_value((x, y + 1))].strip()), }
 
     def wall_between(self, point_1, point_2) -> Tuple[int, int]:
         if point_2 not in self.neighbours(point_1):
@@ -161,6 +466,9 @@ class Maps:
             and become the last visited point.
         If all neighbours are not eligible, the current point will be unmarked as visited and marked as redpoint
             then the current point become the previous point
+        Points are handled as flat indices: a single boolean bitmap marks the visited and the red points
+            (a red point was visited then left), so each point is pushed and popped at most once and the walk
+            runs in linear time in the number of points.
         :param startpoint:
         :param endpoint:
         :return:
@@ -168,25 +476,10 @@ class Maps:
         assert startpoint in self
         assert endpoint in self
         assert startpoint != endpoint
-        visited_points = list()
-        red_points = list()
-        current_point = startpoint
-        visited_points.append(current_point)
-
-        def eligible(x):
-            return (x not in visited_points) and (x not in red_points)
-
-        while current_point != endpoint:
-            neighbours = self.neighbours(current_point)
-            eligible_neighbours = list(filter(eligible, neighbours))
-            if eligible_neighbours:
-                current_point = choice(eligible_neighbours)
-                visited_points.append(current_point)
-            else:
-                red_points.append(visited_points.pop(-1))
-                current_point = visited_points[-1]
-
-        return visited_points
+        m = self.size[1]
+        visited_points = _random_path(self.size, startpoint[0] * m + startpoint[1], endpoint[0] * m + endpoint[1],
+                                      self._rng)
+        return [divmod(x, m) for x in visited_points]
 
 
 class BoxCoordError(Exception):
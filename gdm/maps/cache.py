@@ -0,0 +1,140 @@
+import sys
+from collections import OrderedDict
+from hashlib import blake2b
+from typing import Callable, Hashable
+
+import numpy as np
+
+from gdm.maps.base import Maps
+from gdm.maps.dungeonmap import DungeonMaps
+from gdm.maps.packed import PackedWalls
+
+__all__ = ["map_hash", "batch_hashes", "ArtifactCache", "artifacts"]
+
+
+def _hash(size, horizontal: np.ndarray, vertical: np.ndarray, keypoints: np.ndarray) -> str:
+    digest = blake2b(digest_size=16)
+    digest.update(np.asarray(size, dtype="<i4").tobytes())
+    digest.update(np.ascontiguousarray(horizontal, dtype=np.uint8).tobytes())
+    digest.update(np.ascontiguousarray(vertical, dtype=np.uint8).tobytes())
+    digest.update(np.ascontiguousarray(keypoints, dtype="<i4").tobytes())
+    return digest.hexdigest()
+
+
+def map_hash(_map: Maps) -> str:
+    """
+    Canonical content hash of a map: its size, its walls and its keypoints (the starting, ending and treasure
+        points of a 'DungeonMaps', the nonzero boxes otherwise). It does not depend on the backend of the map and is
+        computed once per map, whose walls are assumed fixed once built.
+    """
+    if _map._content_hash is None:
+        walls = _map._walls if _map.packed else PackedWalls.from_grid(_map._grid)
+        if isinstance(_map, DungeonMaps):
+            keypoints = [_map.starting_point, _map.ending_point, _map.treasure_point]
+        else:
+            box = _map._box_array()
+            keypoints = [(x, y, box[x, y]) for x, y in np.argwhere(box).tolist()]
+        _map._content_hash = _hash(_map.size, walls.horizontal, walls.vertical, keypoints)
+    return _map._content_hash
+
+
+def batch_hashes(grids: np.ndarray, keypoints: np.ndarray) -> list:
+    """
+    Content hashes of a batch of maps as returned by 'DungeonMaps.generate', equal to the 'map_hash' of the
+        corresponding 'DungeonMaps'. Duplicates of a batch or across datasets share a hash.
+    """
+    num_maps, size = len(grids), (grids.shape[1] // 2, grids.shape[2] // 2)
+    horizontal = np.packbits((grids[:, ::2, 1::2] != 0).reshape(num_maps, -1), axis=1)
+    vertical = np.packbits((grids[:, 1::2, ::2] != 0).reshape(num_maps, -1), axis=1)
+    return [_hash(size, horizontal[i], vertical[i], keypoints[i]) for i in range(num_maps)]
+
+
+def _nbytes(value) -> int:
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(map(_nbytes, value))
+    if isinstance(value, dict):
+        return sum(_nbytes(key) + _nbytes(item) for key, item in value.items())
+    return sys.getsizeof(value)
+
+
+def _freeze(value):
+    # artifacts are shared between identical maps, so their arrays must not be modified in place
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, (tuple, list)):
+        for item in value:
+            _freeze(item)
+
+
+class ArtifactCache:
+    """
+    Bounded LRU cache of the artifacts derived from maps (legal moves, rendered layers, models...), keyed by the
+        content hash of the map and the name of the artifact, so that identical maps share their artifacts.
+    The least recently used artifacts are evicted once the cached artifacts exceed 'max_bytes' or 'max_entries'. Each
+        entry is charged 'entry_overhead' bytes on top of its arrays, for its key, hash string and python objects.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 2 ** 20, max_entries: int = 2 ** 16, entry_overhead: int = 512):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.entry_overhead = entry_overhead
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+
+    def get(self, key: Hashable, default=None):
+        if key not in self._entries:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return self._entries[key][0]
+
+    def put(self, key: Hashable, value):
+        if key in self._entries:
+            self.nbytes -= self._entries.pop(key)[1]
+        _freeze(value)
+        nbytes = _nbytes(value) + self.entry_overhead
+        self._entries[key] = (value, nbytes)
+        self.nbytes += nbytes
+        while (self.nbytes > self.max_bytes or len(self._entries) > self.max_entries) and len(self._entries) > 1:
+            self.nbytes -= self._entries.popitem(last=False)[1][1]
+            self.evictions += 1
+
+    def get_or_compute(self, _map: Maps, name: str, compute: Callable):
+        """
+        :param _map:
+        :param name: name of the artifact
+        :param compute: function of the map computing the artifact on a miss
+        :return:
+        """
+        key = (map_hash(_map), name)
+        value = self.get(key, self)
+        if value is self:
+            value = compute(_map)
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        self._entries.clear()
+        self.nbytes = 0
+
+    def stats(self) -> dict:
+        requests = self.hits + self.misses
+        return {"entries": len(self._entries), "max_entries": self.max_entries, "bytes": self.nbytes,
+                "max_bytes": self.max_bytes, "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "hit_rate": self.hits / requests if requests else 0.}
+
+
+# Cache shared by the environments
+artifacts = ArtifactCache()
@@ -0,0 +1,91 @@
+from typing import NamedTuple
+
+import numpy as np
+
+from gdm.maps.base import Maps, _blocked_moves
+
+__all__ = ["DisjointSet", "Components", "connected_components", "keypoints_connected", "batch_keypoints_connected"]
+
+
+class DisjointSet:
+    """
+    Disjoint-set forest over 'size' elements stored as a parent array. Unions are applied to whole arrays of pairs:
+        each round hooks the root of the larger index under the smallest root it is paired with, then compresses
+        every path by pointer jumping, until all the pairs share a root.
+    """
+
+    def __init__(self, size: int):
+        self.parent = np.arange(size)
+
+    def _compress(self):
+        while True:
+            grandparent = self.parent[self.parent]
+            if np.array_equal(grandparent, self.parent):
+                return
+            self.parent = grandparent
+
+    def find(self, items) -> np.ndarray:
+        self._compress()
+        return self.parent[items]
+
+    def union(self, items_1, items_2):
+        items_1, items_2 = np.asarray(items_1), np.asarray(items_2)
+        while items_1.size:
+            roots_1, roots_2 = self.find(items_1), self.find(items_2)
+            apart = roots_1 != roots_2
+            items_1, items_2, roots_1, roots_2 = items_1[apart], items_2[apart], roots_1[apart], roots_2[apart]
+            np.minimum.at(self.parent, np.maximum(roots_1, roots_2), np.minimum(roots_1, roots_2))
+
+    def labels(self) -> np.ndarray:
+        """Label of the set of each element, numbered from 0 in order of their smallest element"""
+        return np.unique(self.find(np.arange(len(self.parent))), return_inverse=True)[1]
+
+
+class Components(NamedTuple):
+    labels: np.ndarray
+    sizes: np.ndarray
+
+    @property
+    def num_components(self) -> int:
+        return len(self.sizes)
+
+
+def _box_sets(blocked_moves: np.ndarray) -> DisjointSet:
+    """Union of the boxes of one or several maps that are not separated by a closed wall"""
+    n, m = blocked_moves.shape[-3:-1]
+    index = np.arange(blocked_moves[..., 0].size).reshape(blocked_moves.shape[:-1])
+    # the external walls are always closed, so the down and right moves stay within each map
+    down, right = blocked_moves[..., 1], blocked_moves[..., 3]
+    disjoint_set = DisjointSet(index.size)
+    disjoint_set.union(np.concatenate([index[~down], index[~right]]),
+                       np.concatenate([index[~down] + m, index[~right] + 1]))
+    return disjoint_set
+
+
+def connected_components(_map: Maps) -> Components:
+    """
+    Connected components of the boxes of a map
+    :param _map:
+    :return: the (n, m) component label of each box and the size of each component
+    """
+    labels = _box_sets(_map.blocked_moves()).labels().reshape(_map.size)
+    return Components(labels, np.bincount(labels.ravel()))
+
+
+def keypoints_connected(_map) -> bool:
+    """Whether the starting, treasure and ending points of a 'DungeonMaps' are mutually reachable"""
+    labels = connected_components(_map).labels
+    return labels[_map.starting_point] == labels[_map.treasure_point] == labels[_map.ending_point]
+
+
+def batch_keypoints_connected(grids: np.ndarray, keypoints: np.ndarray) -> np.ndarray:
+    """
+    Validate a batch of maps, as returned by 'DungeonMaps.generate'
+    :param grids: array of shape (N, 2n + 1, 2m + 1)
+    :param keypoints: array of shape (N, 3, 2)
+    :return: boolean array of shape (N, ), True when all the keypoints of a map are mutually reachable
+    """
+    num_maps, n, m = len(grids), grids.shape[1] // 2, grids.shape[2] // 2
+    roots = _box_sets(_blocked_moves(grids)).find(
+        np.arange(num_maps)[:, None] * n * m + keypoints[..., 0] * m + keypoints[..., 1])
+    return (roots == roots[:, :1]).all(axis=1)
@@ -0,0 +1,129 @@
+from typing import Tuple
+
+import numpy as np
+
+from gdm.maps.dungeonmap import DungeonMaps
+from gdm.maps.packed import PackedWalls
+
+__all__ = ["MapDatasetWriter", "MapDataset"]
+
+_MAGIC = b"GDMMAPS"
+_VERSION = 1
+_HEADER_SIZE = 64
+_header_dtype = np.dtype([("magic", "S8"), ("version", "<u4"), ("n", "<u4"), ("m", "<u4"), ("record_size", "<u4"),
+                          ("count", "<u8")])
+
+
+def _record_dtype(size: Tuple[int, int]) -> np.dtype:
+    """One record per map: the packed horizontal and vertical walls, then the starting, ending and treasure points"""
+    n, m = size
+    return np.dtype([("horizontal", "u1", (((n + 1) * m + 7) // 8,)), ("vertical", "u1", ((n * (m + 1) + 7) // 8,)),
+                     ("keypoints", "<i4", (3, 2))])
+
+
+class MapDatasetWriter:
+    """
+    Writer of a map dataset file: a fixed-size header followed by fixed-stride records of packed walls and keypoints.
+        The number of maps in the header is updated on close.
+    """
+
+    def __init__(self, path, size: Tuple[int, int]):
+        self.path = path
+        self.size = size
+        self.count = 0
+        self._record_dtype = _record_dtype(size)
+        self._file = open(path, "wb")
+        self._write_header()
+
+    def _write_header(self):
+        header = np.zeros(1, dtype=_header_dtype)
+        header[0] = (_MAGIC, _VERSION, self.size[0], self.size[1], self._record_dtype.itemsize, self.count)
+        self._file.seek(0)
+        self._file.write(header.tobytes().ljust(_HEADER_SIZE, b"\0"))
+        self._file.seek(0, 2)
+
+    def write(self, _map: DungeonMaps):
+        if tuple(_map.size) != tuple(self.size):
+            raise ValueError(f"The dataset holds maps of size {self.size}, not {_map.size}")
+        walls = _map._walls if _map.packed else PackedWalls.from_grid(_map._grid)
+        record = np.zeros(1, dtype=self._record_dtype)
+        record["horizontal"] = walls.horizontal
+        record["vertical"] = walls.vertical
+        record["keypoints"] = [_map.starting_point, _map.ending_point, _map.treasure_point]
+        self._file.write(record.tobytes())
+        self.count += 1
+
+    def write_batch(self, grids: np.ndarray, keypoints: np.ndarray):
+        """
+        :param grids: array of shape (N, 2n + 1, 2m + 1), as returned by 'DungeonMaps.generate'
+        :param keypoints: array of shape (N, 3, 2)
+        """
+        if grids.shape[1:] != (2 * self.size[0] + 1, 2 * self.size[1] + 1):
+            raise ValueError(f"The dataset holds maps of size {self.size}")
+        records = np.zeros(len(grids), dtype=self._record_dtype)
+        records["horizontal"] = np.packbits((grids[:, ::2, 1::2] != 0).reshape(len(grids), -1), axis=1)
+        records["vertical"] = np.packbits((grids[:, 1::2, ::2] != 0).reshape(len(grids), -1), axis=1)
+        records["keypoints"] = keypoints
+        self._file.write(records.tobytes())
+        self.count += len(grids)
+
+    def close(self):
+        if not self._file.closed:
+            self._write_header()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class MapDataset:
+    """
+    Memory-mapped reader of a map dataset file. Opening a dataset only reads its header.
+    Indexing returns packed 'DungeonMaps' whose walls are views on the file, slicing returns a dataset view, and an
+        array of indices returns a list of maps, for random sampling.
+    """
+
+    def __init__(self, path, _records: np.ndarray = None, _size: Tuple[int, int] = None):
+        self.path = path
+        if _records is not None:
+            self.size, self._records = _size, _records
+            return
+        header = np.fromfile(path, dtype=_header_dtype, count=1)
+        if len(header) == 0 or header[0]["magic"] != _MAGIC:
+            raise ValueError(f"{path} is not a map dataset")
+        if header[0]["version"] != _VERSION:
+            raise ValueError(f"Unsupported map dataset version {header[0]['version']}")
+        self.size = (int(header[0]["n"]), int(header[0]["m"]))
+        record_dtype = _record_dtype(self.size)
+        count = int(header[0]["count"])
+        if count:
+            self._records = np.memmap(path, dtype=record_dtype, mode="r", offset=_HEADER_SIZE, shape=(count,))
+        else:
+            self._records = np.zeros(0, dtype=record_dtype)
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return MapDataset(self.path, _records=self._records[item], _size=self.size)
+        if isinstance(item, (int, np.integer)):
+            record = self._records[item]
+            walls = PackedWalls(self.size, record["horizontal"], record["vertical"])
+            return DungeonMaps.from_packed(walls, record["keypoints"])
+        return [self[i] for i in np.asarray(item).tolist()]
+
+    @property
+    def keypoints(self) -> np.ndarray:
+        """Starting, ending and treasure points of all the maps, of shape (N, 3, 2)"""
+        return self._records["keypoints"]
+
+    def sample(self, num_maps: int, seed=None) -> list:
+        return self[np.random.default_rng(seed).integers(len(self), size=num_maps)]
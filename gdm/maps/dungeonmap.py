@@ -1,7 +1,27 @@
+from functools import lru_cache
 from typing import Tuple
 
+import numpy as np
+
 from gdm.maps.base import *
-from random import randint, random
+from gdm.maps.base import _random_paths
+from gdm.maps.packed import PackedWalls
+from gdm.profiling import profiled
+
+
+@lru_cache(maxsize=None)
+def _wall_masks(shape: Tuple[int, int]):
+    """Boolean masks of the horizontal and vertical wall coordinates of a dilated grid of shape 'shape'"""
+    i, j = np.ogrid[:shape[0], :shape[1]]
+    horizontal = (i % 2 == 0) & (j % 2 == 1)
+    vertical = (i % 2 == 1) & (j % 2 == 0)
+    horizontal.flags.writeable = False
+    vertical.flags.writeable = False
+    return horizontal, vertical
+
+
+# Number of boxes of the maps 'DungeonMaps.generate' works on at once, which bounds its working memory
+_GENERATE_CHUNK_BOXES = 1 << 19
 
 
 class DungeonMaps(Maps):
@@ -14,9 +34,45 @@ class DungeonMaps(Maps):
         obj._ending_point = None
         obj._treasure_point = None
         obj._keypoint = set()
+        obj._open_wall_bits = None
         return obj
 
-    def __init__(self, *args, **kwargs):
+    @property
+    def permanently_open_walls(self) -> set:
+        """Dilated coordinates of the walls of the ensured paths, built from '_open_walls' on first access"""
+        if self._open_walls_set is None:
+            self._open_walls_set = set(map(tuple, self._open_wall_array().tolist()))
+        return self._open_walls_set
+
+    @permanently_open_walls.setter
+    def permanently_open_walls(self, walls):
+        # arrays of shape (K, 2) of the open walls, one per ensured path, or None once packed in '_open_wall_bits'
+        self._open_walls = [np.array(list(walls), dtype=np.intp).reshape(-1, 2)]
+        self._open_wall_bits = None
+        self._open_walls_set = None
+
+    def _open_wall_array(self) -> np.ndarray:
+        if self._open_walls is None:
+            return self._open_wall_bits.coords()
+        return np.concatenate(self._open_walls)
+
+    def pack(self):
+        """
+        See 'Maps.pack'. The permanently open walls are packed in the bit layout of the walls too.
+        :return: the map itself
+        """
+        if not self.packed:
+            self._open_wall_bits = PackedWalls.from_coords(self.size, self._open_wall_array())
+            self._open_walls = None
+            self._open_walls_set = None
+        return super().pack()
+
+    @profiled("maps.construction")
+    def __init__(self, *args, seed=None, **kwargs):
+        """
+        :param seed: seed or numpy Generator used for every random draw of the map
+        """
+        self._rng = np.random.default_rng(seed)
         super().__init__(*args, **kwargs)
         self._set_starting_point()
         self._set_ending_point()
@@ -25,8 +81,85 @@ class DungeonMaps(Maps):
         self._build_random_walls()
 
     @staticmethod
-    def generate(self, dim: Tuple[int, int]):
-        raise NotImplementedError
+    @profiled("maps.generate")
+    def generate(num_maps: int, size: Tuple[int, int] = (4, 4), p: float = 0.3, seed=None):
+        """
+        Generate a batch of maps with vectorized operations across the whole batch. The maps follow the same
+        distribution as the ones built by the constructor.
+        :param num_maps:
+        :param size:
+        :param p: probability for each wall that is not on an ensured path to be closed
+        :param seed: seed or numpy Generator of the batch
+        :return: the grids as an int8 array of shape (N, 2n + 1, 2m + 1) and the starting, ending and treasure points
+            as an array of shape (N, 3, 2)
+        """
+        assert 0 <= p <= 1
+        n, m = size
+        if n * m < 3:
+            raise KeypointError("The map is too small to hold the three keypoints")
+        rng = np.random.default_rng(seed)
+        grids = np.empty((num_maps, 2 * n + 1, 2 * m + 1), dtype=np.int8)
+        keypoints = np.empty((num_maps, 3, 2), dtype=np.intp)
+        chunk_size = max(1, _GENERATE_CHUNK_BOXES // (n * m))
+        for start in range(0, num_maps, chunk_size):
+            stop = min(start + chunk_size, num_maps)
+            DungeonMaps._generate_chunk(size, p, rng, grids[start:stop], keypoints[start:stop])
+        return grids, keypoints
+
+    @staticmethod
+    def _generate_chunk(size: Tuple[int, int], p: float, rng: np.random.Generator, grids: np.ndarray,
+                        keypoints: np.ndarray):
+        """Fill the given views of the outputs of 'generate' with new maps"""
+        n, m = size
+        num_maps = len(grids)
+        rows = np.arange(num_maps)
+
+        # three distinct random boxes per map, in random order
+        keys = rng.random((num_maps, n * m))
+        points = np.argpartition(keys, 2, axis=1)[:, :3]
+        points = np.take_along_axis(points, np.argsort(np.take_along_axis(keys, points, 1), axis=1), 1)
+        starting_points, ending_points, treasure_points = points.T
+
+        # ensured paths: starting point -> treasure point, then treasure point -> ending point when needed
+        paths, lengths = _random_paths(size, starting_points, treasure_points, rng)
+        on_path = (paths == ending_points[:, None]) & (np.arange(n * m) < lengths[:, None])
+        missing = np.flatnonzero(~on_path.any(axis=1))
+        extra_paths, extra_lengths = _random_paths(size, treasure_points[missing], ending_points[missing], rng)
+
+        shape = (2 * n + 1, 2 * m + 1)
+        protected = np.zeros((num_maps,) + shape, dtype=bool)
+        for batch, path, length in ((rows, paths, lengths), (missing, extra_paths, extra_lengths)):
+            steps = np.nonzero(np.arange(n * m - 1) < (length - 1)[:, None])
+            x_1, y_1 = np.divmod(path[:, :-1][steps], m)
+            x_2, y_2 = np.divmod(path[:, 1:][steps], m)
+            protected[batch[steps[0]], x_1 + x_2 + 1, y_1 + y_2 + 1] = True
+
+        horizontal, vertical = _wall_masks(shape)
+        built = (rng.random(protected.shape, dtype=np.float32) <= p) & ~protected
+        grids[:] = Maps(size)._grid
+        grids[built & horizontal] = -2
+        grids[built & vertical] = -1
+        x, y = np.divmod(points, m)
+        grids[rows[:, None], 2 * x + 1, 2 * y + 1] = [1, 2, 3]
+        keypoints[..., 0] = x
+        keypoints[..., 1] = y
+
+    @classmethod
+    def from_packed(cls, walls, keypoints):
+        """
+        Map built on given packed walls without any random draw, such as a view on a dataset record.
+        The permanently open walls of the original map are unknown.
+        :param walls: 'PackedWalls' of the map
+        :param keypoints: starting, ending and treasure points, of shape (3, 2)
+        :return:
+        """
+        obj = cls.__new__(cls)
+        obj.size = walls.size
+        obj._starting_point, obj._ending_point, obj._treasure_point = map(tuple, np.asarray(keypoints).tolist())
+        obj._keypoint = {obj._starting_point, obj._ending_point, obj._treasure_point}
+        obj._walls = walls
+        obj._box_items = {obj._starting_point: 1., obj._ending_point: 2., obj._treasure_point: 3.}
+        return obj
 
     @property
     def starting_point(self) -> Tuple[int, int]:
@@ -85,6 +218,11 @@ class DungeonMaps(Maps):
                 self._keypoint.add(point)
                 self[point] = 3
 
+    def optimal_episode_length(self) -> int:
+        """Minimal number of actions to collect the treasure then exit: both shortest paths plus collect and exit"""
+        distances = self.distance_field([self._treasure_point])
+        return int(distances[self._starting_point] + distances[self._ending_point]) + 2
+
     def random_keypoint(self):
         keypoint = self._random_point()
         while keypoint in self._keypoint:
@@ -93,7 +231,7 @@ class DungeonMaps(Maps):
 
     def _random_point(self):
         n, m = self.size
-        return randint(0, n - 1), randint(0, m - 1)
+        return int(self._rng.integers(n)), int(self._rng.integers(m))
 
     def _ensure_path_between_keypoint(self):
         ensured_path_to_treasure = self.random_path(self._starting_point, self._treasure_point)
@@ -109,9 +247,11 @@ class DungeonMaps(Maps):
         self._ensure_path(path=ensured_path)
 
     def _ensure_path(self, path: list):
-        for i in range(len(path) - 1):
-            wall = self.wall_between(path[i], path[i + 1])
-            self.permanently_open_walls.add(wall)
+        # the wall between two consecutive points of the path is the middle of their dilated coordinates
+        dilated_path = 2 * np.array(path) + 1
+        walls = (dilated_path[:-1] + dilated_path[1:]) // 2
+        self._open_walls.append(walls.reshape(-1, 2))
+        self._open_walls_set = None
 
     def _build_wall_at(self, key):
         x, y = key
@@ -121,15 +261,18 @@ class DungeonMaps(Maps):
             self._grid[x, y] = -1
 
     def _build_random_walls(self, p: float = 0.3):
+        """
+        Close each wall of the grid with probability 'p', except the permanently open ones.
+        The parity masks, the protected walls and the Bernoulli draw are built as whole arrays.
+        :param p:
+        :return:
+        """
         assert 0 <= p <= 1
-        n, m = self._key_dilatation(self.size)
-        for i in range(0, n):
-            for j in range(0, m):
-                if not self._is_wall((i, j)):
-                    continue
-                elif (i, j) in self.permanently_open_walls:
-                    continue
-                elif random() > p:
-                    continue
-                else:
-                    self._build_wall_at((i, j))
+        shape = self._key_dilatation(self.size)
+        horizontal, vertical = _wall_masks(shape)
+        protected = np.zeros(shape, dtype=bool)
+        walls = self._open_wall_array()
+        protected[walls[:, 0], walls[:, 1]] = True
+        built = (self._rng.random(shape) <= p) & ~protected
+        self._grid[horizontal & built] = -2
+        self._grid[vertical & built] = -1
@@ -0,0 +1,83 @@
+import numpy as np
+from typing import Tuple
+
+__all__ = ["PackedWalls"]
+
+
+class PackedWalls:
+    """
+    Compact storage of the walls of a map of size (n, m): the (n + 1, m) horizontal walls and the (n, m + 1)
+        vertical walls are two packed bit arrays, one bit per wall (1 when closed).
+    """
+
+    def __init__(self, size: Tuple[int, int], horizontal: np.ndarray, vertical: np.ndarray):
+        self.size = size
+        self.horizontal = horizontal
+        self.vertical = vertical
+
+    @classmethod
+    def from_grid(cls, grid: np.ndarray):
+        n, m = grid.shape[0] // 2, grid.shape[1] // 2
+        return cls((n, m), np.packbits(grid[::2, 1::2] != 0), np.packbits(grid[1::2, ::2] != 0))
+
+    @classmethod
+    def from_coords(cls, size: Tuple[int, int], coords: np.ndarray):
+        """
+        Walls closed at the given dilated coordinates, all the others open
+        :param size:
+        :param coords: array of shape (K, 2)
+        """
+        n, m = size
+        grid = np.zeros((2 * n + 1, 2 * m + 1), dtype=bool)
+        grid[coords[:, 0], coords[:, 1]] = True
+        return cls.from_grid(grid)
+
+    def coords(self) -> np.ndarray:
+        """
+        Dilated coordinates of the closed walls, the inverse of 'from_coords'
+        :return: array of shape (K, 2)
+        """
+        horizontal = np.argwhere(self.horizontal_walls()) * 2 + [0, 1]
+        vertical = np.argwhere(self.vertical_walls()) * 2 + [1, 0]
+        return np.concatenate([horizontal, vertical])
+
+    @property
+    def nbytes(self) -> int:
+        return self.horizontal.nbytes + self.vertical.nbytes
+
+    def horizontal_walls(self) -> np.ndarray:
+        n, m = self.size
+        return np.unpackbits(self.horizontal, count=(n + 1) * m).reshape(n + 1, m).view(bool)
+
+    def vertical_walls(self) -> np.ndarray:
+        n, m = self.size
+        return np.unpackbits(self.vertical, count=n * (m + 1)).reshape(n, m + 1).view(bool)
+
+    def to_grid(self, box: np.ndarray = None) -> np.ndarray:
+        """
+        Build the dilated int grid of the map
+        :param box: values of the boxes, zeros when None
+        :return:
+        """
+        n, m = self.size
+        grid = np.zeros((2 * n + 1, 2 * m + 1), dtype=int)
+        grid[::2, ::2] = -3
+        grid[::2, 1::2] = -2 * self.horizontal_walls()
+        grid[1::2, ::2] = -1 * self.vertical_walls()
+        if box is not None:
+            grid[1::2, 1::2] = box
+        return grid
+
+    def is_closed(self, wall_coord: Tuple[int, int]) -> bool:
+        x, y = wall_coord
+        if x % 2 == 0:
+            bits, k = self.horizontal, (x // 2) * self.size[1] + y // 2
+        else:
+            bits, k = self.vertical, (x // 2) * (self.size[1] + 1) + y // 2
+        return bool((bits[k >> 3] >> (7 - (k & 7))) & 1)
+
+    def get_wall(self, wall_coord: Tuple[int, int]) -> int:
+        """Value of the wall in the dilated grid: -2 for a closed horizontal wall, -1 for a vertical one, 0 if open"""
+        if not self.is_closed(wall_coord):
+            return 0
+        return -2 if wall_coord[0] % 2 == 0 else -1
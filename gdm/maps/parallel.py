@@ -0,0 +1,34 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Tuple
+
+import numpy as np
+
+from gdm.maps.dungeonmap import DungeonMaps
+
+__all__ = ["generate_maps"]
+
+
+def _build_map(task: tuple) -> DungeonMaps:
+    size, seed = task
+    return DungeonMaps(size=size, seed=seed)
+
+
+def generate_maps(num_maps: int, size: Tuple[int, int] = (4, 4), seed=None,
+                  num_workers: int = None, chunksize: int = 16) -> List[DungeonMaps]:
+    """
+    Build 'num_maps' maps over a pool of processes.
+    Each map gets its own RNG stream spawned from the master seed, so the same master seed gives the same maps,
+        in the same order, whatever the number of workers.
+    :param num_maps:
+    :param size:
+    :param seed: master seed
+    :param num_workers: number of processes, all the CPUs by default. With a single worker the maps are built
+        in the current process.
+    :param chunksize: number of maps sent to a worker at once
+    :return: the maps in submission order
+    """
+    tasks = [(size, seed_sequence) for seed_sequence in np.random.SeedSequence(seed).spawn(num_maps)]
+    if num_workers == 1:
+        return list(map(_build_map, tasks))
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        return list(executor.map(_build_map, tasks, chunksize=chunksize))
@@ -0,0 +1,175 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from queue import Queue
+from typing import Iterator, Tuple
+
+import numpy as np
+
+from gdm.maps.dataset import MapDataset, MapDatasetWriter
+from gdm.maps.dungeonmap import DungeonMaps
+
+__all__ = ["stream_maps", "MapPipeline"]
+
+
+def _build_chunk(task: tuple) -> list:
+    size, entropy, start, count = task
+    return [DungeonMaps(size=size, seed=np.random.SeedSequence(entropy, spawn_key=(i,)))
+            for i in range(start, start + count)]
+
+
+def stream_maps(size: Tuple[int, int] = (4, 4), seed: int = None, start: int = 0, num_maps: int = None,
+                num_workers: int = 1, chunksize: int = 64) -> Iterator[DungeonMaps]:
+    """
+    Yield maps continuously. Map i is built from the i-th child of the master seed, as in 'generate_maps', so a
+        stream can be resumed from any index.
+    :param size:
+    :param seed: master seed
+    :param start: index of the first map
+    :param num_maps: number of maps to yield, endless when None
+    :param num_workers: number of processes building the maps. At most two chunks per worker are in flight.
+    :param chunksize: number of maps built by a task
+    :return:
+    """
+    entropy = np.random.SeedSequence(seed).entropy
+    stop = np.inf if num_maps is None else start + num_maps
+
+    def tasks():
+        i = start
+        while i < stop:
+            count = int(min(chunksize, stop - i))
+            yield size, entropy, i, count
+            i += count
+
+    if num_workers == 1:
+        for task in tasks():
+            yield from _build_chunk(task)
+        return
+    max_pending = 2 * (num_workers or os.cpu_count())
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        pending = []
+        for task in tasks():
+            pending.append(executor.submit(_build_chunk, task))
+            if len(pending) >= max_pending:
+                yield from pending.pop(0).result()
+        for future in pending:
+            yield from future.result()
+
+
+class MapPipeline:
+    """
+    Dataset build: maps are produced by a background thread into a bounded queue and written into shard files of
+        at most 'shard_size' maps (see 'MapDatasetWriter'), so memory stays flat however many maps are produced.
+    A shard is written under a temporary name and renamed once complete, and the manifest of the directory records
+        the completed shards and the number of maps they hold: running the same pipeline again resumes after the last
+        completed shard, which may be partial when an earlier run asked for fewer maps.
+    """
+
+    def __init__(self, directory, num_maps: int, size: Tuple[int, int] = (4, 4), shard_size: int = 100000,
+                 seed: int = None, num_workers: int = 1, queue_size: int = 1024, report_every: float = 1.):
+        self.directory = directory
+        self.num_maps = num_maps
+        self.size = tuple(size)
+        self.shard_size = shard_size
+        self.seed = np.random.SeedSequence(seed).entropy
+        self.num_workers = num_workers
+        self.queue_size = queue_size
+        self.report_every = report_every
+        self.completed_shards = 0
+        self.completed_maps = 0
+
+    @property
+    def _manifest_path(self):
+        return os.path.join(self.directory, "manifest.json")
+
+    def shard_path(self, shard: int):
+        return os.path.join(self.directory, f"shard-{shard:05d}.gdm")
+
+    def _load_manifest(self):
+        if not os.path.exists(self._manifest_path):
+            return
+        with open(self._manifest_path) as file:
+            manifest = json.load(file)
+        if (manifest["size"], manifest["shard_size"]) != (list(self.size), self.shard_size):
+            raise ValueError("The directory holds a dataset built with other parameters")
+        self.seed = manifest["seed"]
+        self.num_maps = max(self.num_maps, manifest["num_maps"])
+        self.completed_shards = manifest["completed_shards"]
+        if "completed_maps" in manifest:
+            self.completed_maps = manifest["completed_maps"]
+        else:
+            # manifest written before the number of maps was recorded
+            self.completed_maps = sum(len(MapDataset(self.shard_path(shard))) for shard in range(self.completed_shards))
+
+    def _save_manifest(self):
+        manifest = {"size": list(self.size), "shard_size": self.shard_size, "seed": self.seed,
+                    "num_maps": self.num_maps, "completed_shards": self.completed_shards,
+                    "completed_maps": self.completed_maps}
+        with open(self._manifest_path + ".tmp", "w") as file:
+            json.dump(manifest, file)
+        os.replace(self._manifest_path + ".tmp", self._manifest_path)
+
+    def _produce(self, queue: Queue, start: int, stop_event: threading.Event):
+        try:
+            for dungeon_map in stream_maps(self.size, self.seed, start, self.num_maps - start, self.num_workers):
+                if stop_event.is_set():
+                    return
+                queue.put(dungeon_map)
+        except BaseException as error:
+            queue.put(error)
+            return
+        queue.put(None)
+
+    def run(self) -> dict:
+        """
+        :return: the number of maps written by this run, its duration and its throughput
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_manifest()
+        self._save_manifest()
+        start = min(self.completed_maps, self.num_maps)
+        queue = Queue(maxsize=self.queue_size)
+        stop_event = threading.Event()
+        producer = threading.Thread(target=self._produce, args=(queue, start, stop_event), daemon=True)
+        producer.start()
+
+        written, writer = 0, None
+        began = last_report = time.perf_counter()
+        try:
+            while (dungeon_map := queue.get()) is not None:
+                if isinstance(dungeon_map, BaseException):
+                    raise dungeon_map
+                if writer is None:
+                    writer = MapDatasetWriter(self.shard_path(self.completed_shards) + ".tmp", self.size)
+                writer.write(dungeon_map)
+                written += 1
+                if writer.count == self.shard_size:
+                    self._complete_shard(writer)
+                    writer = None
+                if time.perf_counter() - last_report >= self.report_every:
+                    last_report = time.perf_counter()
+                    print(f"\rMaps: {start + written} ({written / (last_report - began):.0f} maps/s)", end="")
+            if writer is not None:
+                self._complete_shard(writer)
+        finally:
+            stop_event.set()
+            while producer.is_alive():
+                # unblock the producer if it waits on a full queue
+                while not queue.empty():
+                    queue.get_nowait()
+                producer.join(timeout=0.1)
+            if writer is not None:
+                writer.close()
+
+        duration = time.perf_counter() - began
+        print(f"\rMaps: {start + written} ({written / max(duration, 1e-9):.0f} maps/s)")
+        return {"maps": written, "seconds": duration, "maps_per_second": written / max(duration, 1e-9)}
+
+    def _complete_shard(self, writer: MapDatasetWriter):
+        writer.close()
+        os.replace(writer.path, self.shard_path(self.completed_shards))
+        self.completed_shards += 1
+        self.completed_maps += writer.count
+        self._save_manifest()
@@ -0,0 +1,93 @@
+from collections import deque
+import threading
+from typing import Callable, Tuple
+
+from gdm.maps.dungeonmap import DungeonMaps
+from gdm.maps.pipeline import stream_maps
+
+__all__ = ["MapPool"]
+
+
+class MapPool:
+    """
+    Bounded pool of ready maps, refilled by a background thread. The maps come out in the order of 'stream_maps',
+        so a seeded pool yields the same sequence of maps on every run.
+    """
+
+    def __init__(self, size: Tuple[int, int] = (4, 4), capacity: int = 64, seed=None, start: int = 0,
+                 prepare: Callable = None, num_workers: int = 1):
+        """
+        :param size:
+        :param capacity: maximum number of ready maps
+        :param seed: master seed of the map sequence, see 'stream_maps'
+        :param start: index of the first map in the sequence
+        :param prepare: optional function of a map run in the background thread, whose result is returned with the
+            map, such as a table derived from it
+        :param num_workers: number of processes building the maps, the background thread itself when 1
+        """
+        self.size = size
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._prepare = prepare
+        self._maps = stream_maps(size, seed, start, num_workers=num_workers, chunksize=min(capacity, 64))
+        self._pool = deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._error = None
+        self._thread = threading.Thread(target=self._refill, daemon=True)
+        self._thread.start()
+
+    def _refill(self):
+        try:
+            for _map in self._maps:
+                item = (_map, self._prepare(_map) if self._prepare else None)
+                with self._condition:
+                    while len(self._pool) >= self.capacity and not self._closed:
+                        self._condition.wait()
+                    if self._closed:
+                        return
+                    self._pool.append(item)
+                    self._condition.notify_all()
+        except BaseException as error:
+            with self._condition:
+                self._error = error
+                self._condition.notify_all()
+
+    def get(self) -> Tuple[DungeonMaps, object]:
+        """
+        Next map of the sequence. It is a hit when the map is ready, otherwise a miss that waits for the background
+            thread.
+        :return: the map and the result of 'prepare' on it, None without 'prepare'
+        """
+        with self._condition:
+            if self._pool:
+                self.hits += 1
+            else:
+                self.misses += 1
+                while not self._pool:
+                    if self._error is not None:
+                        raise RuntimeError("The map pool stopped") from self._error
+                    if self._closed:
+                        raise RuntimeError("The map pool is closed")
+                    self._condition.wait()
+            item = self._pool.popleft()
+            self._condition.notify_all()
+        return item
+
+    def __len__(self) -> int:
+        return len(self._pool)
+
+    def stats(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "ready": len(self._pool), "capacity": self.capacity}
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
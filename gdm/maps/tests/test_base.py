@@ -67,4 +67,33 @@ class TestMaps(TestCase):
         self.assertEqual(self.basic_map.neighbours((2, 0)), {(2, 1), (1, 0)})
         self.assertEqual(self.basic_map.neighbours((0, 2)), {(0, 1), (1, 2)})
         self.assertEqual(self.basic_map.neighbours((2, 2)), {(2, 1), (1, 2)})
-        self.assertEqual(self.basic_map.neighbours((1, 1)), {(0, 1), (1, 0), (1, 2), (2, 1)})
\ No newline at end of file
+        self.assertEqual(self.basic_map.neighbours((1, 1)), {(0, 1), (1, 0), (1, 2), (2, 1)})
+
+    def test_random_path(self):
+        path = self.basic_map.random_path((0, 0), (2, 2))
+        self.assertEqual(path[0], (0, 0))
+        self.assertEqual(path[-1], (2, 2))
+        self.assertEqual(len(set(path)), len(path))
+        for point_1, point_2 in zip(path[:-1], path[1:]):
+            self.assertIn(point_2, self.basic_map.neighbours(point_1))
+
+    def test_blocked_moves(self):
+        blocked = self.basic_map.blocked_moves()
+        self.assertEqual(blocked.shape, (3, 3, 4))
+        self.assertEqual(list(blocked[0, 0]), [True, False, True, False])
+        self.assertEqual(list(blocked[1, 1]), [False, False, False, False])
+        self.assertEqual(list(blocked[2, 2]), [False, True, False, True])
+        self.assertTrue(np.array_equal(self.basic_map.pack().blocked_moves(), blocked))
+
+    def test_distance_field(self):
+        self.basic_map._grid[2, 1] = -2
+        self.basic_map._grid[2, 3] = -2
+        distances = self.basic_map.distance_field([(0, 0)])
+        self.assertEqual(distances.tolist(), [[0, 1, 2], [5, 4, 3], [6, 5, 4]])
+        self.assertEqual(self.basic_map.distance_field([(0, 0), (2, 0)])[1].tolist(), [1, 2, 3])
+
+    def test_all_pairs_distances(self):
+        distances = self.basic_map.all_pairs_distances()
+        self.assertEqual(distances.shape, (9, 9))
+        self.assertEqual(distances[0, 8], 4)
+        self.assertTrue(np.array_equal(distances[4].reshape(3, 3), self.basic_map.distance_field([(1, 1)])))
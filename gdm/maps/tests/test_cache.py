@@ -0,0 +1,62 @@
+from gdm.maps.cache import ArtifactCache, batch_hashes, map_hash
+from gdm.maps.dungeonmap import DungeonMaps
+from gdm.maps.packed import PackedWalls
+from unittest import TestCase
+import numpy as np
+
+
+class TestMapHash(TestCase):
+
+    def test_map_hash(self):
+        self.assertEqual(map_hash(DungeonMaps(size=(4, 4), seed=1)), map_hash(DungeonMaps(size=(4, 4), seed=1)))
+        self.assertNotEqual(map_hash(DungeonMaps(size=(4, 4), seed=1)), map_hash(DungeonMaps(size=(4, 4), seed=2)))
+        dungeon_map = DungeonMaps(size=(5, 3), seed=0)
+        self.assertEqual(map_hash(dungeon_map), map_hash(DungeonMaps(size=(5, 3), seed=0).pack()))
+
+    def test_batch_hashes(self):
+        grids, keypoints = DungeonMaps.generate(3, size=(4, 4), seed=0)
+        hashes = batch_hashes(grids, keypoints)
+        self.assertEqual(len(set(hashes + batch_hashes(grids[:1], keypoints[:1]))), 3)
+        self.assertEqual(hashes[0], map_hash(DungeonMaps.from_packed(PackedWalls.from_grid(grids[0]), keypoints[0])))
+
+
+class TestArtifactCache(TestCase):
+
+    def setUp(self) -> None:
+        self.cache = ArtifactCache(max_bytes=200, entry_overhead=0)
+        self.dungeon_map = DungeonMaps(size=(4, 4), seed=0)
+
+    def test_get_or_compute(self):
+        computed = []
+
+        def compute(_map):
+            computed.append(_map)
+            return np.zeros(10)
+
+        first = self.cache.get_or_compute(self.dungeon_map, "zeros", compute)
+        second = self.cache.get_or_compute(DungeonMaps(size=(4, 4), seed=0), "zeros", compute)
+        self.assertIs(first, second)
+        self.assertEqual(len(computed), 1)
+        self.assertFalse(first.flags.writeable)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_eviction(self):
+        for i in range(3):
+            self.cache.put(i, np.zeros(10))
+        self.assertEqual(len(self.cache), 2)
+        self.assertNotIn(0, self.cache)
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+        self.assertEqual(self.cache.stats()["bytes"], 160)
+
+    def test_entry_overhead(self):
+        cache = ArtifactCache(max_bytes=1000, entry_overhead=400)
+        for i in range(3):
+            cache.put(i, np.zeros(1))
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.stats()["bytes"], 816)
+
+    def test_max_entries(self):
+        cache = ArtifactCache(max_entries=2)
+        for i in range(3):
+            cache.put(i, i)
+        self.assertEqual(list(cache._entries), [1, 2])
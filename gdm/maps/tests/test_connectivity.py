@@ -0,0 +1,42 @@
+from gdm.maps.base import Maps
+from gdm.maps.connectivity import DisjointSet, connected_components, keypoints_connected, batch_keypoints_connected
+from gdm.maps.dungeonmap import DungeonMaps
+from unittest import TestCase
+
+
+class TestDisjointSet(TestCase):
+
+    def test_union(self):
+        disjoint_set = DisjointSet(6)
+        disjoint_set.union([0, 4, 3], [4, 2, 5])
+        self.assertEqual(disjoint_set.labels().tolist(), [0, 1, 0, 2, 0, 2])
+        self.assertEqual(disjoint_set.find(2), disjoint_set.find(0))
+
+
+class TestConnectivity(TestCase):
+
+    def setUp(self) -> None:
+        self.basic_map = Maps(size=(3, 3))
+        # wall off the right column
+        self.basic_map._grid[1::2, 4] = -1
+
+    def test_connected_components(self):
+        components = connected_components(self.basic_map)
+        self.assertEqual(components.labels.tolist(), [[0, 0, 1], [0, 0, 1], [0, 0, 1]])
+        self.assertEqual(components.sizes.tolist(), [6, 3])
+        self.assertEqual(components.num_components, 2)
+
+    def test_keypoints_connected(self):
+        self.assertTrue(keypoints_connected(DungeonMaps(size=(5, 5))))
+
+    def test_batch_keypoints_connected(self):
+        grids, keypoints = DungeonMaps.generate(20, size=(3, 3), seed=0)
+        self.assertTrue(batch_keypoints_connected(grids, keypoints).all())
+        grids[:, 1::2, 4] = -1
+        expected = []
+        for grid, points in zip(grids, keypoints):
+            self.basic_map._grid = grid
+            distances = self.basic_map.distance_field([tuple(points[0])])
+            expected.append(all(distances[tuple(point)] >= 0 for point in points))
+        self.assertEqual(batch_keypoints_connected(grids, keypoints).tolist(), expected)
+        self.assertFalse(all(expected))
@@ -0,0 +1,46 @@
+from gdm.maps.dataset import MapDataset, MapDatasetWriter
+from gdm.maps.dungeonmap import DungeonMaps
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+import numpy as np
+import os
+
+
+class TestMapDataset(TestCase):
+
+    def setUp(self) -> None:
+        self.directory = TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "maps.gdm")
+        self.maps = [DungeonMaps(size=(4, 5), seed=i) for i in range(3)]
+        self.grids, self.keypoints = DungeonMaps.generate(20, size=(4, 5), seed=0)
+        with MapDatasetWriter(self.path, (4, 5)) as writer:
+            for dungeon_map in self.maps:
+                writer.write(dungeon_map)
+            writer.write_batch(self.grids, self.keypoints)
+        self.dataset = MapDataset(self.path)
+
+    def tearDown(self) -> None:
+        del self.dataset
+        self.directory.cleanup()
+
+    def test_len(self):
+        self.assertEqual(len(self.dataset), 23)
+        self.assertEqual(self.dataset.size, (4, 5))
+
+    def test_getitem(self):
+        for i, dungeon_map in enumerate(self.maps):
+            self.assertTrue(self.dataset[i].packed)
+            self.assertEqual(repr(self.dataset[i]), repr(dungeon_map))
+            self.assertEqual(self.dataset[i].treasure_point, dungeon_map.treasure_point)
+
+    def test_slice(self):
+        view = self.dataset[3:]
+        self.assertEqual(len(view), 20)
+        self.assertTrue(np.array_equal(view.keypoints, self.keypoints))
+        self.assertTrue(np.array_equal(view[7]._grid, self.grids[7]))
+        self.assertEqual(len(self.dataset[[0, 5, 5]]), 3)
+
+    def test_invalid_file(self):
+        with open(self.path, "wb") as file:
+            file.write(b"not a dataset")
+        self.assertRaises(ValueError, MapDataset, self.path)
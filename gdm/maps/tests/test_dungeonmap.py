@@ -0,0 +1,85 @@
+from gdm.maps import dungeonmap
+from gdm.maps.connectivity import batch_keypoints_connected
+from gdm.maps.dungeonmap import DungeonMaps
+from unittest import TestCase
+import numpy as np
+
+
+class TestDungeonMaps(TestCase):
+
+    def setUp(self) -> None:
+        self.dungeon_map = DungeonMaps(size=(6, 5))
+
+    def test_keypoints(self):
+        keypoints = {self.dungeon_map.starting_point, self.dungeon_map.ending_point, self.dungeon_map.treasure_point}
+        self.assertEqual(len(keypoints), 3)
+        self.assertEqual(self.dungeon_map[self.dungeon_map.starting_point], 1)
+        self.assertEqual(self.dungeon_map[self.dungeon_map.ending_point], 2)
+        self.assertEqual(self.dungeon_map[self.dungeon_map.treasure_point], 3)
+
+    def test__build_random_walls(self):
+        grid = self.dungeon_map._grid
+        self.assertTrue(np.all(grid[::2, ::2] == -3))
+        self.assertTrue(np.all(np.isin(grid[::2, 1::2], [0, -2])))
+        self.assertTrue(np.all(np.isin(grid[1::2, ::2], [0, -1])))
+        for wall in self.dungeon_map.permanently_open_walls:
+            self.assertEqual(grid[wall], 0)
+
+    def test__build_random_walls_probability(self):
+        self.dungeon_map._build_random_walls(p=1)
+        grid = self.dungeon_map._grid
+        n, m = grid.shape
+        for i in range(1, n - 1):
+            for j in range(1, m - 1):
+                if not self.dungeon_map._is_wall((i, j)):
+                    continue
+                if (i, j) in self.dungeon_map.permanently_open_walls:
+                    self.assertEqual(grid[i, j], 0)
+                else:
+                    self.assertEqual(grid[i, j], -2 if i % 2 == 0 else -1)
+
+    def test_generate(self):
+        grids, keypoints = DungeonMaps.generate(50, size=(4, 6), seed=0)
+        self.assertEqual(grids.shape, (50, 9, 13))
+        self.assertEqual(keypoints.shape, (50, 3, 2))
+        self.assertTrue(grids.flags.c_contiguous and keypoints.flags.c_contiguous)
+        for grid, points in zip(grids, keypoints):
+            self.assertEqual(len({tuple(point) for point in points}), 3)
+            self.assertEqual([grid[2 * x + 1, 2 * y + 1] for x, y in points], [1, 2, 3])
+            self.assertTrue(np.all(grid[::2, ::2] == -3))
+            self.assertTrue(np.all(grid[[0, -1], 1::2] == -2))
+            self.assertTrue(np.all(grid[1::2, [0, -1]] == -1))
+
+    def test_generate_seed(self):
+        grids_1, keypoints_1 = DungeonMaps.generate(10, seed=7)
+        grids_2, keypoints_2 = DungeonMaps.generate(10, seed=7)
+        self.assertTrue(np.array_equal(grids_1, grids_2))
+        self.assertTrue(np.array_equal(keypoints_1, keypoints_2))
+
+    def test_generate_chunks(self):
+        chunk_boxes = dungeonmap._GENERATE_CHUNK_BOXES
+        dungeonmap._GENERATE_CHUNK_BOXES = 5 * 4 * 4
+        try:
+            grids, keypoints = DungeonMaps.generate(101, size=(4, 4), seed=0)
+        finally:
+            dungeonmap._GENERATE_CHUNK_BOXES = chunk_boxes
+        self.assertEqual(grids.dtype, np.int8)
+        self.assertEqual(grids.shape, (101, 9, 9))
+        self.assertTrue(batch_keypoints_connected(grids, keypoints).all())
+
+    def test_generate_large_maps(self):
+        # few long walks are drawn one by one
+        grids, keypoints = DungeonMaps.generate(3, size=(12, 10), seed=0)
+        self.assertTrue(batch_keypoints_connected(grids, keypoints).all())
+
+    def test_seed(self):
+        map_1 = DungeonMaps(size=(5, 5), seed=3)
+        map_2 = DungeonMaps(size=(5, 5), seed=3)
+        self.assertTrue(np.array_equal(map_1._grid, map_2._grid))
+        self.assertEqual(map_1.permanently_open_walls, map_2.permanently_open_walls)
+
+    def test_optimal_episode_length(self):
+        distances = self.dungeon_map.distance_field([self.dungeon_map.treasure_point])
+        self.assertGreaterEqual(self.dungeon_map.optimal_episode_length(), 4)
+        self.assertEqual(self.dungeon_map.optimal_episode_length(),
+                         distances[self.dungeon_map.starting_point] + distances[self.dungeon_map.ending_point] + 2)
@@ -0,0 +1,67 @@
+from gdm.maps.dungeonmap import DungeonMaps
+from gdm.maps.packed import PackedWalls
+from unittest import TestCase
+import pickle
+import numpy as np
+
+
+class TestPackedWalls(TestCase):
+
+    def setUp(self) -> None:
+        self.dungeon_map = DungeonMaps(size=(7, 5), seed=0)
+        self.grid = self.dungeon_map._grid.copy()
+        self.walls = PackedWalls.from_grid(self.grid)
+
+    def test_to_grid(self):
+        self.assertTrue(np.array_equal(self.walls.to_grid(self.dungeon_map.box), self.grid))
+
+    def test_get_wall(self):
+        n, m = self.grid.shape
+        for i in range(n):
+            for j in range(m):
+                if (i + j) % 2:
+                    self.assertEqual(self.walls.get_wall((i, j)), self.grid[i, j])
+
+    def test_nbytes(self):
+        self.assertEqual(self.walls.nbytes, 5 + 6)
+
+    def test_coords(self):
+        coords = np.array([[0, 1], [2, 3], [3, 0], [5, 10]])
+        walls = PackedWalls.from_coords(self.dungeon_map.size, coords)
+        self.assertEqual(sorted(map(tuple, walls.coords().tolist())), sorted(map(tuple, coords.tolist())))
+
+
+class TestPackedMaps(TestCase):
+
+    def setUp(self) -> None:
+        self.dungeon_map = DungeonMaps(size=(6, 6), seed=1)
+        self.repr = repr(self.dungeon_map)
+        self.grid = self.dungeon_map._grid.copy()
+        self.dungeon_map.pack()
+
+    def test_queries(self):
+        self.assertEqual(repr(self.dungeon_map), self.repr)
+        self.assertEqual(self.dungeon_map.get_wall((0, 1)), -2)
+        self.assertEqual(self.dungeon_map.get_wall((3, 4)), self.grid[3, 4])
+        self.assertEqual(self.dungeon_map.get_walls_around((2, 3))["left"], ((5, 6), '|' if self.grid[5, 6] else ''))
+        self.assertEqual(self.dungeon_map.wall_between((1, 1), (2, 1)), (4, 3))
+        self.assertTrue(self.dungeon_map.packed)
+
+    def test_open_walls(self):
+        dungeon_map = DungeonMaps(size=(6, 6), seed=1)
+        self.assertEqual(self.dungeon_map.permanently_open_walls, dungeon_map.permanently_open_walls)
+
+    def test_packed_size(self):
+        dungeon_map = DungeonMaps(size=(256, 256), seed=0)
+        size = len(pickle.dumps(dungeon_map))
+        dungeon_map.distance_field([dungeon_map.starting_point])
+        dungeon_map.pack()
+        self.assertEqual(dungeon_map._distances, {})
+        # the walls and the open walls take 16 kB each
+        self.assertLess(len(pickle.dumps(dungeon_map)), 40000)
+        self.assertGreater(size / len(pickle.dumps(dungeon_map)), 60)
+
+    def test_unpack(self):
+        self.assertEqual(self.dungeon_map[self.dungeon_map.treasure_point], 3)
+        self.assertFalse(self.dungeon_map.packed)
+        self.assertTrue(np.array_equal(self.dungeon_map._grid, self.grid))
@@ -0,0 +1,19 @@
+from gdm.maps.parallel import generate_maps
+from unittest import TestCase
+import numpy as np
+
+
+class TestParallel(TestCase):
+
+    def test_generate_maps(self):
+        maps = generate_maps(6, size=(3, 4), seed=11, num_workers=1)
+        self.assertEqual(len(maps), 6)
+        self.assertTrue(all(map_.size == (3, 4) for map_ in maps))
+        self.assertEqual(len({repr(map_) for map_ in maps}), 6)
+
+    def test_generate_maps_workers(self):
+        serial = generate_maps(8, seed=5, num_workers=1)
+        parallel = generate_maps(8, seed=5, num_workers=3, chunksize=1)
+        for map_1, map_2 in zip(serial, parallel):
+            self.assertTrue(np.array_equal(map_1._grid, map_2._grid))
+            self.assertEqual(map_1.starting_point, map_2.starting_point)
@@ -0,0 +1,53 @@
+from gdm.maps.dataset import MapDataset
+from gdm.maps.parallel import generate_maps
+from gdm.maps.pipeline import MapPipeline, stream_maps
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+import numpy as np
+import os
+
+
+class TestPipeline(TestCase):
+
+    def setUp(self) -> None:
+        self.directory = TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_stream_maps(self):
+        maps = generate_maps(6, size=(3, 3), seed=2, num_workers=1)
+        streamed = list(stream_maps(size=(3, 3), seed=2, start=2, num_maps=4, chunksize=3))
+        self.assertEqual(len(streamed), 4)
+        for map_1, map_2 in zip(maps[2:], streamed):
+            self.assertTrue(np.array_equal(map_1._grid, map_2._grid))
+
+    def test_run(self):
+        pipeline = MapPipeline(self.directory.name, num_maps=25, size=(3, 4), shard_size=10, seed=0, report_every=60)
+        self.assertEqual(pipeline.run()["maps"], 25)
+        self.assertEqual([len(MapDataset(pipeline.shard_path(i))) for i in range(3)], [10, 10, 5])
+
+    def test_resume(self):
+        pipeline = MapPipeline(self.directory.name, num_maps=20, size=(3, 4), shard_size=10, seed=0, report_every=60)
+        pipeline.run()
+        with open(pipeline.shard_path(1), "rb") as file:
+            shard = file.read()
+        # an interrupted run that only completed the first shard
+        os.remove(pipeline.shard_path(1))
+        pipeline.completed_shards, pipeline.completed_maps = 1, 10
+        pipeline._save_manifest()
+        resumed = MapPipeline(self.directory.name, num_maps=20, size=(3, 4), shard_size=10, report_every=60)
+        self.assertEqual(resumed.run()["maps"], 10)
+        with open(pipeline.shard_path(1), "rb") as file:
+            self.assertEqual(file.read(), shard)
+
+    def test_resume_partial_shard(self):
+        MapPipeline(self.directory.name, num_maps=15, size=(3, 4), shard_size=10, seed=0, report_every=60).run()
+        pipeline = MapPipeline(self.directory.name, num_maps=30, size=(3, 4), shard_size=10, report_every=60)
+        self.assertEqual(pipeline.run()["maps"], 15)
+        shards = [MapDataset(pipeline.shard_path(i)) for i in range(pipeline.completed_shards)]
+        self.assertEqual([len(shard) for shard in shards], [10, 5, 10, 5])
+        maps = generate_maps(30, size=(3, 4), seed=0, num_workers=1)
+        written = [dungeon_map for shard in shards for dungeon_map in shard]
+        for map_1, map_2 in zip(maps, written):
+            self.assertTrue(np.array_equal(map_1._grid, map_2._grid))
@@ -0,0 +1,21 @@
+from gdm.maps.pipeline import stream_maps
+from gdm.maps.pool import MapPool
+from unittest import TestCase
+
+
+class TestMapPool(TestCase):
+
+    def test_sequence(self):
+        with MapPool(size=(4, 3), capacity=4, seed=0, prepare=lambda _map: _map.size) as pool:
+            maps = [pool.get() for _ in range(10)]
+        self.assertEqual([repr(_map) for _map, _ in maps], [repr(_map) for _map in stream_maps((4, 3), 0, 0, 10)])
+        self.assertTrue(all(size == (4, 3) for _, size in maps))
+        self.assertEqual(pool.hits + pool.misses, 10)
+
+    def test_close(self):
+        pool = MapPool(size=(3, 3), capacity=2)
+        pool.get()
+        pool.close()
+        while len(pool):
+            pool.get()
+        self.assertRaises(RuntimeError, pool.get)
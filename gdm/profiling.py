@@ -0,0 +1,196 @@
+"""
+Opt-in instrumentation of the hot paths: named timers and counters, aggregated per episode.
+Everything is a no-op until 'enable' is called: a profiled function then only costs one flag check per call.
+
+    from gdm import profiling
+    profiling.enable()
+    ...
+    profiling.snapshot()
+"""
+from functools import wraps
+from time import perf_counter
+
+import numpy as np
+
+
+class _Stats:
+    __slots__ = ("count", "total", "max", "episode_count", "episode_total", "episodes")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.
+        self.max = 0.
+        self.episode_count = 0
+        self.episode_total = 0.
+        # (count, total) of each finished episode
+        self.episodes = []
+
+    def add(self, value: float = 0., count: int = 1):
+        self.count += count
+        self.total += value
+        self.episode_count += count
+        self.episode_total += value
+        if value > self.max:
+            self.max = value
+
+
+class Profiler:
+    def __init__(self):
+        self.enabled = False
+        self._timers = {}
+        self._counters = {}
+        self._num_episodes = 0
+
+    def _stats(self, table: dict, name: str) -> _Stats:
+        stats = table.get(name)
+        if stats is None:
+            stats = table[name] = _Stats()
+        return stats
+
+    def record(self, name: str, seconds: float):
+        self._stats(self._timers, name).add(seconds)
+
+    def count(self, name: str, n: int = 1):
+        if self.enabled:
+            self._stats(self._counters, name).add(count=n)
+
+    def timer(self, name: str):
+        """
+        Context manager timing its block under 'name'
+        """
+        return _Timer(self, name) if self.enabled else _null_timer
+
+    def profiled(self, name: str):
+        """
+        Decorator timing each call of the function under 'name'
+        """
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return function(*args, **kwargs)
+                start = perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.record(name, perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def end_episode(self):
+        """
+        Close the current episode: its totals are appended to the per-episode history of every timer and counter
+        """
+        if not self.enabled:
+            return
+        self._num_episodes += 1
+        for stats in (*self._timers.values(), *self._counters.values()):
+            stats.episodes.append((stats.episode_count, stats.episode_total))
+            stats.episode_count = 0
+            stats.episode_total = 0.
+
+    def reset(self):
+        self._timers.clear()
+        self._counters.clear()
+        self._num_episodes = 0
+
+    def snapshot(self, bins: int = 10) -> dict:
+        """
+        :param bins: number of bins of the per-episode histograms
+        :return: {"timers": {name: stats}, "counters": {name: stats}, "episodes": number of finished episodes}.
+            The stats of a timer are its number of calls, its total, mean and max time in seconds and the histogram of
+            its total time per episode. Those of a counter are its total and the histogram of its total per episode.
+        """
+        timers = {}
+        for name, stats in self._timers.items():
+            timers[name] = {"count": stats.count, "total": stats.total, "max": stats.max,
+                            "mean": stats.total / stats.count if stats.count else 0.,
+                            "per_episode": _histogram([total for _, total in stats.episodes], bins)}
+        counters = {name: {"total": stats.count,
+                           "per_episode": _histogram([count for count, _ in stats.episodes], bins)}
+                    for name, stats in self._counters.items()}
+        return {"timers": timers, "counters": counters, "episodes": self._num_episodes}
+
+    def summary(self) -> str:
+        """
+        One line summary of the total time of each timer and of each counter
+        """
+        timers = " ".join(f"{name}={stats.total:.3f}s" for name, stats in
+                          sorted(self._timers.items(), key=lambda item: -item[1].total))
+        counters = " ".join(f"{name}={stats.count}" for name, stats in self._counters.items())
+        return " ".join(filter(None, (timers, counters)))
+
+
+def _histogram(values: list, bins: int) -> dict:
+    if not values:
+        return {"counts": [], "edges": []}
+    counts, edges = np.histogram(values, bins=bins)
+    return {"counts": counts.tolist(), "edges": edges.tolist()}
+
+
+class _Timer:
+    __slots__ = ("_profiler", "_name", "_start")
+
+    def __init__(self, profiler: Profiler, name: str):
+        self._profiler = profiler
+        self._name = name
+
+    def __enter__(self):
+        self._start = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._profiler.record(self._name, perf_counter() - self._start)
+        return False
+
+
+class _NullTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_null_timer = _NullTimer()
+
+
+class Reporter:
+    def __init__(self, profiler: Profiler, interval: float = 5.):
+        """
+        Periodic summary of a profiler
+        :param interval: minimum number of seconds between two reports
+        """
+        self.profiler = profiler
+        self.interval = interval
+        self._last = perf_counter()
+
+    def __call__(self) -> str:
+        """
+        :return: the summary of the profiler if it is enabled and the interval has elapsed since the last report,
+            otherwise an empty string
+        """
+        now = perf_counter()
+        if not self.profiler.enabled or now - self._last < self.interval:
+            return ""
+        self._last = now
+        return self.profiler.summary()
+
+
+profiler = Profiler()
+timer = profiler.timer
+profiled = profiler.profiled
+count = profiler.count
+end_episode = profiler.end_episode
+snapshot = profiler.snapshot
+reset = profiler.reset
+
+
+def enable():
+    profiler.enabled = True
+
+
+def disable():
+    profiler.enabled = False
@@ -0,0 +1,205 @@
+"""
+Actor/learner Q-learning over processes. The actors run their own environment and policy on a Q-table in shared
+    memory and send their transitions to the learner through one single-producer single-consumer ring buffer each.
+    The learner applies the TD updates by batches with 'QTable.update_batch'.
+"""
+import ctypes
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+
+from gdm.rl.methods.qlearning import QTable
+from gdm.rl.tools import Q, Policy
+
+__all__ = ["SharedQTable", "RingBuffer", "distributed_qlearning"]
+
+_transition_dtype = np.dtype([("state", "<i8"), ("action", "<i8"), ("reward", "<f8"), ("next_state", "<i8")])
+# the read and write counters of a ring are on distinct cache lines
+_COUNTER_STRIDE = 8
+# number of learner rounds between two checks of the actors, which are also checked whenever the rings are empty
+_LIVENESS_ROUNDS = 64
+
+
+class SharedQTable(QTable):
+    """
+    Q-table in shared memory, handed to the processes at their creation. The reads of the actors are not
+        synchronized with the writes of the learner.
+    """
+
+    def __init__(self, num_states: int, num_actions: int, alpha: float):
+        Q.__init__(self, num_states, num_actions, alpha)
+        self._buffer = mp.RawArray(ctypes.c_double, num_states * num_actions)
+        self._table = np.frombuffer(self._buffer).reshape(num_states, num_actions)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_table"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._table = np.frombuffer(self._buffer).reshape(self.num_states, self.num_actions)
+
+
+class RingBuffer:
+    """
+    Lock-free ring of transitions between one producer and one consumer process. The write and read counters only
+        grow, each of them is written by a single side, and a slot is only reused once the consumer has read it.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._buffer = mp.RawArray(ctypes.c_uint8, capacity * _transition_dtype.itemsize)
+        self._counters_buffer = mp.RawArray(ctypes.c_uint64, 2 * _COUNTER_STRIDE)
+        self._attach()
+
+    def _attach(self):
+        self._records = np.frombuffer(self._buffer, dtype=_transition_dtype)
+        self._counters = np.frombuffer(self._counters_buffer, dtype=np.uint64)
+
+    def __getstate__(self):
+        return self.capacity, self._buffer, self._counters_buffer
+
+    def __setstate__(self, state):
+        self.capacity, self._buffer, self._counters_buffer = state
+        self._attach()
+
+    @property
+    def _written(self) -> int:
+        return int(self._counters[0])
+
+    @property
+    def _read(self) -> int:
+        return int(self._counters[_COUNTER_STRIDE])
+
+    def __len__(self) -> int:
+        return self._written - self._read
+
+    def push(self, transitions: np.ndarray) -> int:
+        """
+        Producer side: append as many transitions as there is room for
+        :return: the number of transitions appended
+        """
+        written = self._written
+        count = min(len(transitions), self.capacity - (written - self._read))
+        start = written % self.capacity
+        first = min(count, self.capacity - start)
+        self._records[start:start + first] = transitions[:first]
+        self._records[:count - first] = transitions[first:count]
+        # the records are written before they are published
+        self._counters[0] = written + count
+        return count
+
+    def pop(self, max_count: int = None) -> np.ndarray:
+        """
+        Consumer side: remove the oldest transitions
+        :return: a copy of at most 'max_count' transitions
+        """
+        read = self._read
+        count = self._written - read
+        if max_count is not None:
+            count = min(count, max_count)
+        start = read % self.capacity
+        first = min(count, self.capacity - start)
+        transitions = np.concatenate([self._records[start:start + first], self._records[:count - first]])
+        self._counters[_COUNTER_STRIDE] = read + count
+        return transitions
+
+
+def _actor(env_fn, q: SharedQTable, ring: RingBuffer, stop, counters, index: int, seed: np.random.SeedSequence,
+           epsilon: float, staleness: int, batch_size: int, time_limit):
+    # 'Policy' draws from the global generator, which must differ between the actors
+    np.random.seed(seed.generate_state(4))
+    env = env_fn()
+    values = q._table.copy() if staleness else q._table
+    policy = Policy(epsilon, values)
+    batch = np.zeros(batch_size, dtype=_transition_dtype)
+    state, t, size, steps = env.reset(), 0, 0, 0
+    while not stop.is_set():
+        action = policy(state)
+        next_state, reward, done = env.fast_step(action)
+        batch[size] = state, action, reward, next_state
+        size += 1
+        steps += 1
+        t += 1
+        if done or t >= time_limit:
+            counters[2 * index] += 1
+            state, t = env.reset(), 0
+        else:
+            state = next_state
+        if size == batch_size:
+            sent = 0
+            while sent < size and not stop.is_set():
+                sent += ring.push(batch[sent:size])
+                if sent < size:
+                    time.sleep(0)
+            size = 0
+            counters[2 * index + 1] = steps
+        if staleness and steps % staleness == 0:
+            np.copyto(values, q._table)
+
+
+def distributed_qlearning(env_fn, q: SharedQTable, num_actors: int = None, num_updates: int = 100000,
+                          discount_rate=0.7, epsilon=0.1, staleness: int = 0, batch_size: int = 256,
+                          ring_size: int = 16384, time_limit=np.inf, seed=None):
+    """
+    Q-learning with 'num_actors' actor processes and the learner in the current process. The learning rule is the
+        one of 'qlearning'.
+    The actors act on Q-values lagging behind the learner by the transitions waiting in the rings (at most
+        'ring_size' per actor) and, with 'staleness', by their local copy of the table.
+    :param env_fn: picklable function building the environment of an actor, such as
+        functools.partial(Dungeon, size=(4, 4)). The environment needs 'reset' and 'fast_step'.
+    :param q: the shared table, updated in place
+    :param num_actors: all the CPUs but the one of the learner by default
+    :param num_updates: number of TD updates before the actors are stopped
+    :param discount_rate:
+    :param epsilon: exploration rate of the actors
+    :param staleness: number of steps between two refreshes of the local copy of the table of each actor. The actors
+        read the shared table directly when 0.
+    :param batch_size: number of transitions an actor sends at once
+    :param ring_size: capacity of the ring of each actor
+    :param time_limit: maximum number of steps of an episode
+    :param seed: master seed of the actors' policies
+    :return: the table and the statistics of the run
+    """
+    num_actors = num_actors or max(1, (os.cpu_count() or 2) - 1)
+    rings = [RingBuffer(ring_size) for _ in range(num_actors)]
+    stop = mp.Event()
+    # number of finished episodes and of steps of each actor
+    counters = mp.RawArray(ctypes.c_int64, 2 * num_actors)
+    seeds = np.random.SeedSequence(seed).spawn(num_actors)
+    actors = [mp.Process(target=_actor, args=(env_fn, q, rings[i], stop, counters, i, seeds[i], epsilon, staleness,
+                                              batch_size, time_limit), daemon=True)
+              for i in range(num_actors)]
+    start = time.perf_counter()
+    for actor in actors:
+        actor.start()
+    updates, rounds = 0, 0
+    try:
+        while updates < num_updates:
+            rounds += 1
+            received = 0
+            for ring in rings:
+                transitions = ring.pop(num_updates - updates)
+                if len(transitions):
+                    targets = transitions["reward"] + discount_rate * np.max(q[transitions["next_state"]], axis=1)
+                    q.update_batch(transitions["state"], transitions["action"], targets)
+                    updates += len(transitions)
+                    received += len(transitions)
+            if not received or rounds % _LIVENESS_ROUNDS == 0:
+                # the actors only return once stopped, so any exit is a crash, even while the others keep sending
+                failed = [actor.exitcode for actor in actors if actor.exitcode is not None]
+                if failed:
+                    raise RuntimeError(f"An actor exited with code {failed[0]}")
+            if not received:
+                time.sleep(0)
+    finally:
+        stop.set()
+        for actor in actors:
+            actor.join()
+    seconds = time.perf_counter() - start
+    counts = np.frombuffer(counters, dtype=np.int64).reshape(num_actors, 2)
+    return q, {"updates": updates, "seconds": seconds, "updates_per_second": updates / seconds,
+               "episodes": counts[:, 0].tolist(), "steps": counts[:, 1].tolist()}
@@ -0,0 +1,188 @@
+import json
+import os
+
+import numpy as np
+
+from gdm.rl.methods.qlearning import QTable
+from gdm.rl.tools import Q
+
+__all__ = ["MemmapQTable"]
+
+
+class MemmapQTable(QTable):
+    """
+    Q-table living in a memory-mapped .npy file, so that it does not need to fit in memory.
+    The updates are written directly into the file. The checkpointed table is a second file, '<path>.ckpt', and the
+        blocks of rows updated since the last checkpoint are recorded in a third one, '<path>.dirty', before they are
+        written. A checkpoint:
+        - writes the dirty blocks to a write-ahead log, '<path>.wal0' or '<path>.wal1' by checkpoint parity, and
+            syncs it
+        - commits the checkpoint by atomically replacing '<path>.json'
+        - copies the logged blocks into '<path>.ckpt' and clears the dirty blocks
+    A crash before the commit leaves the previous checkpoint valid, and a crash after it is repaired by replaying the
+        log. A resumed table starts again from the last checkpoint by copying back its dirty blocks only.
+    """
+
+    def __init__(self, path, num_states: int, num_actions: int, alpha: float, block_size: int = 4096,
+                 resume: bool = False):
+        """
+        :param path: file of the table
+        :param num_states:
+        :param num_actions:
+        :param alpha:
+        :param block_size: number of rows of a block, the unit of the checkpoints
+        :param resume: restore the last checkpoint of an existing table instead of starting from zeros. Raises
+            FileNotFoundError when there is no table to resume rather than overwriting the files.
+        """
+        Q.__init__(self, num_states, num_actions, alpha)
+        self.path = path
+        self.block_size = block_size
+        shape = (num_states, num_actions)
+        if resume and not os.path.exists(self._meta_path):
+            raise FileNotFoundError(f"No table to resume at {path}: {self._meta_path} is missing")
+        if resume:
+            with open(self._meta_path) as file:
+                meta = json.load(file)
+            if (meta["num_states"], meta["num_actions"]) != shape:
+                raise ValueError(f"The table at {path} has shape {(meta['num_states'], meta['num_actions'])}, "
+                                 f"not {shape}")
+            self.block_size = meta["block_size"]
+            self.checkpoint_info = meta["checkpoint"]
+            self._checkpoint = np.load(self._checkpoint_path, mmap_mode="r+")
+            self._table = np.load(path, mmap_mode="r+")
+            self._dirty_file = np.load(self._dirty_path, mmap_mode="r+")
+            self._dirty = np.array(self._dirty_file)
+            if self.checkpoint_info["count"]:
+                # the checkpoint may have been committed but not applied
+                self._replay(self._wal_path(self.checkpoint_info["count"]))
+            # discard the updates after the last checkpoint
+            for block in np.flatnonzero(self._dirty).tolist():
+                rows = self._block_rows(block)
+                self._table[rows] = self._checkpoint[rows]
+            self._table.flush()
+            self._clear_dirty()
+        else:
+            self.checkpoint_info = {"count": 0}
+            num_blocks = -(-num_states // self.block_size)
+            # new files are sparse: the zero rows take no disk space nor memory until written
+            self._table = np.lib.format.open_memmap(path, mode="w+", dtype=float, shape=shape)
+            self._checkpoint = np.lib.format.open_memmap(self._checkpoint_path, mode="w+", dtype=float, shape=shape)
+            self._dirty_file = np.lib.format.open_memmap(self._dirty_path, mode="w+", dtype=bool,
+                                                         shape=(num_blocks,))
+            self._dirty = np.zeros(num_blocks, dtype=bool)
+            self._write_meta(self.checkpoint_info)
+
+    @property
+    def _checkpoint_path(self) -> str:
+        return f"{self.path}.ckpt"
+
+    @property
+    def _dirty_path(self) -> str:
+        return f"{self.path}.dirty"
+
+    @property
+    def _meta_path(self) -> str:
+        return f"{self.path}.json"
+
+    def _wal_path(self, count: int) -> str:
+        # two logs by turns: the log of the last committed checkpoint is never overwritten
+        return f"{self.path}.wal{count % 2}"
+
+    def _block_rows(self, block: int) -> slice:
+        return slice(block * self.block_size, (block + 1) * self.block_size)
+
+    def _write_meta(self, checkpoint_info: dict):
+        meta = {"num_states": self.num_states, "num_actions": self.num_actions, "alpha": self.alpha,
+                "block_size": self.block_size, "checkpoint": checkpoint_info}
+        with open(self._meta_path + ".tmp", "w") as file:
+            json.dump(meta, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(self._meta_path + ".tmp", self._meta_path)
+        _fsync_directory(self._meta_path)
+
+    def _write_wal(self, path, blocks: np.ndarray):
+        with open(path, "wb") as file:
+            np.save(file, blocks)
+            for block in blocks.tolist():
+                np.save(file, self._table[self._block_rows(block)])
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _replay(self, path):
+        """Copy the blocks of a write-ahead log into the checkpoint file"""
+        with open(path, "rb") as file:
+            for block in np.load(file).tolist():
+                self._checkpoint[self._block_rows(block)] = np.load(file)
+        self._checkpoint.flush()
+
+    def _mark(self, states):
+        if isinstance(states, (int, np.integer)):
+            blocks = states // self.block_size
+            if self._dirty[blocks]:
+                return
+        elif isinstance(states, np.ndarray) and states.dtype.kind in "iu":
+            blocks = states // self.block_size
+            if self._dirty[blocks].all():
+                return
+        else:
+            blocks = np.arange(self.num_states)[states] // self.block_size
+            if self._dirty[blocks].all():
+                return
+        # a block is recorded as dirty on disk before it is written
+        self._dirty[blocks] = True
+        self._dirty_file[blocks] = True
+        self._dirty_file.flush()
+
+    def _clear_dirty(self):
+        self._dirty[:] = False
+        self._dirty_file[:] = False
+        self._dirty_file.flush()
+
+    def __setitem__(self, key, value):
+        self._mark(key[0] if isinstance(key, tuple) else key)
+        self._table[key] = value
+
+    def update_batch(self, states: np.ndarray, actions: np.ndarray, targets: np.ndarray):
+        self._mark(np.asarray(states))
+        super().update_batch(states, actions, targets)
+
+    @property
+    def num_dirty_blocks(self) -> int:
+        return int(self._dirty.sum())
+
+    def checkpoint(self, **info) -> int:
+        """
+        Log the row blocks updated since the previous checkpoint, commit them and copy them to the checkpoint file
+        :param info: JSON serializable values recorded with the checkpoint, such as the episode number, and returned by
+            'checkpoint_info' after a resume
+        :return: the number of blocks written
+        """
+        blocks = np.flatnonzero(self._dirty)
+        checkpoint_info = {"count": self.checkpoint_info["count"] + 1, **info}
+        wal_path = self._wal_path(checkpoint_info["count"])
+        self._write_wal(wal_path, blocks)
+        self._write_meta(checkpoint_info)
+        self.checkpoint_info = checkpoint_info
+        for block in blocks.tolist():
+            rows = self._block_rows(block)
+            self._checkpoint[rows] = self._table[rows]
+        self._checkpoint.flush()
+        # the dirty blocks are only cleared once the table on disk matches the checkpoint
+        self._table.flush()
+        self._clear_dirty()
+        return len(blocks)
+
+    def flush(self):
+        self._table.flush()
+
+
+def _fsync_directory(path):
+    """Make the renaming of a file in the directory of 'path' durable, where directories can be synced"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    descriptor = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
@@ -0,0 +1,73 @@
+import numpy as np
+from gdm.rl.methods.qlearning import QTable
+
+
+def _action_values(next_states, rewards, dones, values, discount_rate):
+    # the transitions that end the episode do not bootstrap
+    return rewards + discount_rate * np.where(dones, 0, values[next_states])
+
+
+def _check_discount_rate(discount_rate):
+    # the iterations are only contractions, and the values only finite, with a discount rate below 1
+    if not 0 <= discount_rate < 1:
+        raise ValueError(f"The discount rate must be in [0, 1), not {discount_rate}")
+
+
+def value_iteration(env, discount_rate=0.7, alpha=0.1, tol=1e-8, max_iterations=10000) -> QTable:
+    """
+    Exact optimal Q-table of a fully known deterministic environment, such as 'Dungeon' on its current map.
+    :param env: environment exposing 'transition_model()' -> (next_states, rewards, dones) of shape
+        (num_states, num_actions)
+    :param discount_rate:
+    :param alpha: learning rate of the returned table, in case it warm-starts an agent
+    :param tol: stop when the values change by less than 'tol'
+    :param max_iterations:
+    :return:
+    """
+    _check_discount_rate(discount_rate)
+    next_states, rewards, dones = env.transition_model()
+    num_states, num_actions = rewards.shape
+    values = np.zeros(num_states)
+    for _ in range(max_iterations):
+        q = _action_values(next_states, rewards, dones, values, discount_rate)
+        new_values = q.max(axis=1)
+        converged = np.max(np.abs(new_values - values)) < tol
+        values = new_values
+        if converged:
+            break
+    q_table = QTable(num_states, num_actions, alpha)
+    q_table[:] = _action_values(next_states, rewards, dones, values, discount_rate)
+    return q_table
+
+
+def policy_iteration(env, discount_rate=0.7, alpha=0.1, tol=1e-8, max_iterations=1000) -> QTable:
+    """
+    Same as 'value_iteration', alternating an iterative evaluation of the greedy policy and its improvement
+    :param max_iterations: maximum number of improvements, and of iterations of each evaluation
+    :return:
+    """
+    _check_discount_rate(discount_rate)
+    next_states, rewards, dones = env.transition_model()
+    num_states, num_actions = rewards.shape
+    states = np.arange(num_states)
+    policy = np.zeros(num_states, dtype=int)
+    values = np.zeros(num_states)
+    for _ in range(max_iterations):
+        # evaluation
+        policy_next_states, policy_rewards = next_states[states, policy], rewards[states, policy]
+        policy_dones = dones[states, policy]
+        for _ in range(max_iterations):
+            new_values = policy_rewards + discount_rate * np.where(policy_dones, 0, values[policy_next_states])
+            converged = np.max(np.abs(new_values - values)) < tol
+            values = new_values
+            if converged:
+                break
+        # improvement
+        q = _action_values(next_states, rewards, dones, values, discount_rate)
+        new_policy = np.where(q[states, policy] >= q.max(axis=1) - tol, policy, q.argmax(axis=1))
+        if np.array_equal(new_policy, policy):
+            break
+        policy = new_policy
+    q_table = QTable(num_states, num_actions, alpha)
+    q_table[:] = _action_values(next_states, rewards, dones, values, discount_rate)
+    return q_table
@@ -1,5 +1,6 @@
 import numpy as np
 from gdm.rl.tools import Q, Policy, Trajectory, Gain
+from gdm import profiling
 
 
 class QTable(Q):
@@ -13,17 +14,259 @@ class QTable(Q):
     def __setitem__(self, key, value):
         self._table[key] = value
 
+    def save(self, path):
+        """Write the table as a .npy file"""
+        np.save(path, self._table)
+
+    @classmethod
+    def load(cls, path, alpha: float = 0.1, mmap_mode: str = "r"):
+        """
+        Table written by 'save'. With a memory-mapped file, loading is immediate and the rows are read on access.
+        :param mmap_mode: mode of 'np.load', "r" for an evaluation only, "r+" to keep learning in the file, None to
+            read the whole table in memory
+        """
+        table = np.load(path, mmap_mode=mmap_mode)
+        obj = cls.__new__(cls)
+        Q.__init__(obj, *table.shape, alpha)
+        obj._table = table
+        return obj
+
+    @profiling.profiled("qtable.update")
     def update(self, target):
         self[self.current_state, self.current_action] *= (1 - self.alpha)
         self[self.current_state, self.current_action] += (self.alpha * target)
 
+    @profiling.profiled("qtable.update_batch")
+    def update_batch(self, states: np.ndarray, actions: np.ndarray, targets: np.ndarray):
+        """
+        Apply the updates of several (state, action) pairs at once, with the same result as successive calls to
+            'update' in the order of the arrays. The k updates of a duplicate pair with targets t_0, ..., t_(k-1) give
+            q <- (1 - alpha) ** k * q + sum_i alpha * (1 - alpha) ** (k - 1 - i) * t_i
+        """
+        keys = np.ravel_multi_index((states, actions), self._table.shape)
+        order = np.argsort(keys, kind="stable")
+        keys, targets = keys[order], np.asarray(targets, dtype=float)[order]
+        unique_keys, first, counts = np.unique(keys, return_index=True, return_counts=True)
+        # number of later updates of the same pair, for each update
+        remaining = np.repeat(first + counts, counts) - 1 - np.arange(len(keys))
+        contributions = np.add.reduceat(self.alpha * (1 - self.alpha) ** remaining * targets, first)
+        index = np.unravel_index(unique_keys, self._table.shape)
+        self._table[index] = self._table[index] * (1 - self.alpha) ** counts + contributions
+
+
+# Fibonacci hashing of the state indices
+_GOLDEN = 0x9E3779B97F4A7C15
+_UINT64 = (1 << 64) - 1
+
+
+class HashedQTable(Q):
+    """
+    Sparse Q-table for large state spaces: the rows are stored in an open-addressing hash table with linear probing
+        and allocated on the first update of their state. Reading an unvisited state gives zeros.
+    The table doubles up to a memory cap, then evicts the least recently updated rows by batches.
+    """
+
+    def __init__(self, num_states: int, num_actions: int, alpha: float, max_bytes: int = 1 << 30,
+                 initial_capacity: int = 1024, max_load: float = 0.7, evict_fraction: float = 0.25):
+        """
+        :param num_states:
+        :param num_actions:
+        :param alpha:
+        :param max_bytes: memory cap of the keys, rows and update times
+        :param initial_capacity: initial number of slots, rounded to a power of two
+        :param max_load: maximum fraction of occupied slots, strictly between 0 and 1 so that every probe sequence
+            ends on an empty slot
+        :param evict_fraction: fraction of the rows evicted at once when the table is full at its memory cap
+        """
+        if not 0 < max_load < 1:
+            raise ValueError(f"max_load must be strictly between 0 and 1, not {max_load}")
+        super().__init__(num_states, num_actions, alpha)
+        self.max_load = max_load
+        self.evict_fraction = evict_fraction
+        slot_bytes = 8 * (num_actions + 2)
+        self.max_capacity = 1 << max(3, (max_bytes // slot_bytes).bit_length() - 1)
+        self.evictions = 0
+        self._clock = 0
+        self._zeros = np.zeros(num_actions)
+        self._zeros.flags.writeable = False
+        self._allocate(min(1 << max(3, (initial_capacity - 1).bit_length()), self.max_capacity))
+
+    def _allocate(self, capacity: int):
+        self._keys = np.full(capacity, -1, dtype=np.int64)
+        self._values = np.zeros((capacity, self.num_actions))
+        self._stamps = np.zeros(capacity, dtype=np.int64)
+        self._mask = capacity - 1
+        self._shift = 64 - (capacity.bit_length() - 1)
+        self._size = 0
+
+    @property
+    def capacity(self) -> int:
+        return len(self._keys)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _hash(self, states: np.ndarray) -> np.ndarray:
+        return ((states.astype(np.uint64) * np.uint64(_GOLDEN)) >> np.uint64(self._shift)).astype(np.int64)
+
+    def _find(self, state: int) -> int:
+        """Slot of 'state', or -1 - slot with the empty slot that ends its probe sequence"""
+        keys = self._keys
+        slot = ((state * _GOLDEN) & _UINT64) >> self._shift
+        while True:
+            key = keys[slot]
+            if key == state:
+                return slot
+            if key == -1:
+                return -1 - slot
+            slot = (slot + 1) & self._mask
+
+    def _lookup(self, states: np.ndarray) -> np.ndarray:
+        """Vectorized '_find' without insertion: the slots of 'states', -1 for the states absent from the table"""
+        slots = self._hash(states)
+        found = np.full(len(states), -1, dtype=np.int64)
+        pending = np.arange(len(states))
+        while len(pending):
+            keys = self._keys[slots[pending]]
+            hits = keys == states[pending]
+            found[pending[hits]] = slots[pending[hits]]
+            pending = pending[~hits & (keys != -1)]
+            slots[pending] = (slots[pending] + 1) & self._mask
+        return found
+
+    def _insert_all(self, keys: np.ndarray, values: np.ndarray, stamps: np.ndarray):
+        """Vectorized insertion of distinct absent keys: the first key of each free slot wins, the others probe on"""
+        slots = self._hash(keys)
+        pending = np.arange(len(keys))
+        while len(pending):
+            free = self._keys[slots[pending]] == -1
+            _, first = np.unique(slots[pending[free]], return_index=True)
+            winners = pending[free][first]
+            self._keys[slots[winners]] = keys[winners]
+            self._values[slots[winners]] = values[winners]
+            self._stamps[slots[winners]] = stamps[winners]
+            pending = np.setdiff1d(pending, winners, assume_unique=True)
+            slots[pending] = (slots[pending] + 1) & self._mask
+        self._size += len(keys)
+
+    def _rebuild(self, capacity: int, slots: np.ndarray):
+        """Rehash the rows of the given slots into a table of 'capacity' slots"""
+        keys, values, stamps = self._keys[slots], self._values[slots], self._stamps[slots]
+        self._allocate(capacity)
+        self._insert_all(keys, values, stamps)
+
+    def _make_room(self):
+        occupied = np.flatnonzero(self._keys != -1)
+        if self.capacity < self.max_capacity:
+            self._rebuild(2 * self.capacity, occupied)
+            return
+        num_evicted = max(1, int(len(occupied) * self.evict_fraction))
+        oldest = np.argpartition(self._stamps[occupied], num_evicted - 1)[:num_evicted]
+        self._rebuild(self.capacity, np.delete(occupied, oldest))
+        self.evictions += num_evicted
+
+    def _slot(self, state: int) -> int:
+        """Slot of 'state', inserted with zeros when absent"""
+        slot = self._find(state)
+        if slot >= 0:
+            return slot
+        if self._size + 1 > self.max_load * self.capacity:
+            self._make_room()
+            slot = self._find(state)
+        slot = -1 - slot
+        self._keys[slot] = state
+        self._values[slot] = 0.
+        self._size += 1
+        return slot
+
+    def __getitem__(self, item):
+        state, action = item if isinstance(item, tuple) else (item, slice(None))
+        if isinstance(state, (int, np.integer)):
+            slot = self._find(int(state))
+            return (self._values[slot] if slot >= 0 else self._zeros)[action]
+        states = np.asarray(state, dtype=np.int64)
+        slots = self._lookup(states.ravel())
+        values = np.where((slots >= 0)[:, None], self._values[slots], 0.).reshape(*states.shape, self.num_actions)
+        if isinstance(action, slice):
+            return values[..., action]
+        actions = np.broadcast_to(np.asarray(action), states.shape)
+        return np.take_along_axis(values, actions[..., None], axis=-1)[..., 0]
+
+    def _slots(self, states: np.ndarray) -> np.ndarray:
+        """Vectorized '_slot': the slots of 'states', the absent ones being inserted with zeros"""
+        if len(np.unique(states)) > self.max_load * self.max_capacity:
+            raise ValueError(f"{len(np.unique(states))} distinct states do not fit in the table")
+        while True:
+            slots = self._lookup(states)
+            absent = np.unique(states[slots < 0])
+            if self._size + len(absent) <= self.max_load * self.capacity:
+                break
+            self._make_room()
+        if len(absent):
+            self._insert_all(absent, np.zeros((len(absent), self.num_actions)), np.full(len(absent), self._clock))
+            slots = self._lookup(states)
+        return slots
+
+    def __setitem__(self, key, value):
+        """
+        Set the values of a state or of an array of states. Slices of states are not supported since they would
+            allocate every row.
+        """
+        state, action = key if isinstance(key, tuple) else (key, slice(None))
+        if isinstance(state, (int, np.integer)):
+            slot = self._slot(int(state))
+        elif isinstance(state, slice):
+            raise TypeError("HashedQTable rows are set by state index or array of state indices, not by slice")
+        else:
+            states = np.asarray(state, dtype=np.int64)
+            slot = self._slots(states.ravel()).reshape(states.shape)
+        self._values[slot, action] = value
+        self._stamps[slot] = self._clock
+        self._clock += 1
+
+    @profiling.profiled("qtable.update")
+    def update(self, target):
+        slot = self._slot(int(self.current_state))
+        self._values[slot, self.current_action] += self.alpha * (target - self._values[slot, self.current_action])
+        self._stamps[slot] = self._clock
+        self._clock += 1
+
+    @property
+    def nbytes(self) -> int:
+        return self._keys.nbytes + self._values.nbytes + self._stamps.nbytes
+
+    def stats(self) -> dict:
+        """Occupancy of the table"""
+        return {"entries": self._size, "capacity": self.capacity, "load": self._size / self.capacity,
+                "max_capacity": self.max_capacity, "evictions": self.evictions, "nbytes": self.nbytes}
+
+
+def _step_function(env):
+    """
+    Step of 'env' on integer actions and states, returning the next state, the reward and the done flag. It is timed
+        under "env.step" when profiling is enabled, 'fast_step' itself being left undecorated.
+    """
+    if hasattr(env, "fast_step"):
+        step = env.fast_step
+    else:
+        step = lambda action: env.step(action)[:3]  # noqa: E731
+    if profiling.profiler.enabled:
+        step = profiling.profiled("env.step")(step)
+    return step
+
 
 def qlearning(env, q: Q, policy: Policy, discount_rate=0.7,
               num_episodes=10000, time_limit=np.inf,
-              eval_frequency=1000, snapshot_frequency=100):
+              eval_frequency=1000, snapshot_frequency=100, checkpoint_frequency=None):
+    """
+    :param checkpoint_frequency: number of episodes between two calls of 'q.checkpoint', such as
+        'MemmapQTable.checkpoint', with the episode number. No checkpoint when None.
+    """
     gains = list()
     penalties = []
     evals = []
+    reporter = profiling.Reporter(profiling.profiler)
+    step = _step_function(env)
     for i in range(1, num_episodes + 1):
         q.current_state = env.reset()
         trajectory = Trajectory()
@@ -36,7 +279,7 @@ def qlearning(env, q: Q, policy: Policy, discount_rate=0.7,
             # learning
             while not end_game:
                 q.current_action = policy(q.current_state)
-                next_state, reward, win, info = env.step(q.current_action)
+                next_state, reward, win = step(q.current_action)
                 # compute target
                 target = reward + discount_rate * np.max(q[next_state])
                 # update the Q interface
@@ -47,9 +290,13 @@ def qlearning(env, q: Q, policy: Policy, discount_rate=0.7,
                 q.current_state = next_state
                 t += 1
                 end_game = win or (t > time_limit)
+                profiling.count("qlearning.steps")
+            profiling.end_episode()
+            if checkpoint_frequency and i % checkpoint_frequency == 0:
+                q.checkpoint(episode=i)
 
             if i % snapshot_frequency == 0:
-                print(f'\rEpisode: {i}', end="")
+                print(f'\rEpisode: {i} {reporter()}', end="")
                 gains.append(gain)
                 penalties.append(penalty)
 
@@ -64,10 +311,58 @@ def qlearning(env, q: Q, policy: Policy, discount_rate=0.7,
     return q, gains, penalties, evals
 
 
+def batched_qlearning(env, q: QTable, policy: Policy, discount_rate=0.7,
+                      num_episodes=10000, time_limit=np.inf, snapshot_frequency=100):
+    """
+    Q-learning over the K environments of a vectorized environment such as 'VecDungeon', whose episodes advance in
+        lockstep: the K actions are picked at once by 'Policy.batch' and the K TD updates are applied at once by
+        'QTable.update_batch'. The learning rule is the one of 'qlearning'.
+    :return: the Q-table, the discounted gain and the number of penalties (-10 rewards) of each finished episode
+    """
+    num_envs = env.num_envs
+    gains = list()
+    penalties = list()
+    states = env.reset()
+    gain = np.zeros(num_envs)
+    penalty = np.zeros(num_envs, dtype=int)
+    t = np.ones(num_envs, dtype=int)
+    num_finished = 0
+    while num_finished < num_episodes:
+        actions = policy.batch(states)
+        next_states, rewards, wins, info = env.step(actions)
+        # the targets bootstrap on the states reached, not on the states of the automatic resets
+        targets = rewards + discount_rate * np.max(q[info["terminal_states"]], axis=1)
+        q.update_batch(states, actions, targets)
+        gain += discount_rate ** t * rewards
+        penalty += rewards == -10
+
+        t += 1
+        end_games = wins | (t > time_limit)
+        finished = np.flatnonzero(end_games)
+        if finished.size:
+            timed_out = np.flatnonzero(end_games & ~wins)
+            if timed_out.size:
+                next_states = env.reset(timed_out)
+            for i in range(num_finished + 1, num_finished + finished.size + 1):
+                if i % snapshot_frequency == 0:
+                    print(f'\rEpisode: {i}', end="")
+            num_finished += finished.size
+            gains.extend(gain[finished].tolist())
+            penalties.extend(penalty[finished].tolist())
+            gain[finished] = 0
+            penalty[finished] = 0
+            t[finished] = 1
+        states = next_states
+
+    print("\nTraining Finished.\n")
+    return q, gains, penalties
+
+
 def evaluation(policy, env, training=True, num_episodes=100, time_limit=100):
     """Evaluate agent's performance after Q-learning"""
 
     total_epochs, total_penalties = 0, 0
+    step = _step_function(env)
 
     for _ in range(num_episodes):
         state = env.reset()
@@ -77,7 +372,7 @@ def evaluation(policy, env, training=True, num_episodes=100, time_limit=100):
 
         while (not done) and (epochs < time_limit):
             action = policy(state)
-            state, reward, done, info = env.step(action)
+            state, reward, done = step(action)
 
             if reward == -10:
                 penalties += 1
@@ -3,6 +3,8 @@ from collections import deque
 
 import numpy as np
 
+from gdm.profiling import profiled
+
 
 class V(ABC):
     def __init__(self, num_states: int, num_actions: int, num_state_vars: int = None):
@@ -49,11 +51,20 @@ class Q(V, ABC):
 
 class Policy:
 
-    def __init__(self, epsilon, state_action_values, exploit_method=np.argmax):
+    def __init__(self, epsilon, state_action_values, exploit_method=np.argmax, action_mask=None):
+        """
+        :param epsilon:
+        :param state_action_values:
+        :param exploit_method:
+        :param action_mask: optional callable returning the boolean mask of the legal actions of a state,
+            such as 'Dungeon.action_mask'. When given, illegal actions are neither explored nor exploited.
+        """
         self.epsilon = epsilon
         self.exploit_method = exploit_method
         self.P = state_action_values
+        self.action_mask = action_mask
 
+    @profiled("policy")
     def __call__(self, state):
         if np.random.random() < self.epsilon:
             return self.explore(state)
@@ -62,12 +73,33 @@ class Policy:
 
     def explore(self, state):
         values = self.P[state]
+        if self.action_mask is not None:
+            return np.random.choice(np.flatnonzero(self.action_mask(state)))
         return np.random.randint(0, len(values))
 
     def exploit(self, state):
         values = self.P[state]
+        if self.action_mask is not None:
+            values = np.where(self.action_mask(state), values, -np.inf)
         return self.exploit_method(values)
 
+    def batch(self, states: np.ndarray) -> np.ndarray:
+        """
+        Epsilon-greedy actions for an array of states at once. 'exploit_method' must accept an 'axis' argument.
+        :param states: array of shape (K, )
+        :return: array of shape (K, )
+        """
+        values = self.P[states]
+        if self.action_mask is not None:
+            masks = self.action_mask(states)
+            values = np.where(masks, values, -np.inf)
+            # a random legal action is the one with the highest random key
+            random_actions = np.where(masks, np.random.random(masks.shape), -1).argmax(axis=1)
+        else:
+            random_actions = np.random.randint(0, values.shape[1], len(states))
+        explore = np.random.random(len(states)) < self.epsilon
+        return np.where(explore, random_actions, self.exploit_method(values, axis=1))
+
 
 class Trajectory(deque):
     pass
@@ -0,0 +1,62 @@
+from dungeon import Dungeon
+from gdm.rl.methods.distributed import RingBuffer, SharedQTable, distributed_qlearning, _transition_dtype
+from unittest import TestCase
+import functools
+import multiprocessing as mp
+import numpy as np
+
+
+def _transitions(start: int, count: int) -> np.ndarray:
+    transitions = np.zeros(count, dtype=_transition_dtype)
+    transitions["state"] = np.arange(start, start + count)
+    return transitions
+
+
+class _CrashingDungeon(Dungeon):
+    """Dungeon whose first instance fails after a few steps, the others running normally"""
+
+    def __init__(self, crashed, **kwargs):
+        super().__init__(**kwargs)
+        with crashed.get_lock():
+            self._crash, crashed.value = not crashed.value, True
+        self._steps = 0
+
+    def fast_step(self, action: int):
+        self._steps += 1
+        if self._crash and self._steps > 1000:
+            raise RuntimeError("crash")
+        return super().fast_step(action)
+
+
+class TestRingBuffer(TestCase):
+
+    def test_wraparound(self):
+        ring = RingBuffer(5)
+        self.assertEqual(ring.push(_transitions(0, 3)), 3)
+        self.assertEqual(ring.pop(2)["state"].tolist(), [0, 1])
+        # 4 slots are free, the last 2 of them at the start of the buffer
+        self.assertEqual(ring.push(_transitions(3, 6)), 4)
+        self.assertEqual(len(ring), 5)
+        self.assertEqual(ring.push(_transitions(9, 1)), 0)
+        self.assertEqual(ring.pop()["state"].tolist(), [2, 3, 4, 5, 6])
+        self.assertEqual(len(ring.pop()), 0)
+
+
+class TestDistributedQLearning(TestCase):
+
+    def test_two_actors(self):
+        env_fn = functools.partial(Dungeon, size=(2, 2), reset_mode="same")
+        num_states = len(env_fn().states)
+        q, stats = distributed_qlearning(env_fn, SharedQTable(num_states, 6, alpha=0.1), num_actors=2,
+                                         num_updates=5000, batch_size=64, ring_size=256, time_limit=50, seed=0)
+        self.assertEqual(stats["updates"], 5000)
+        self.assertEqual(len(stats["steps"]), 2)
+        self.assertGreaterEqual(sum(stats["steps"]), 5000)
+        self.assertTrue(np.any(q[:] != 0))
+
+    def test_crashed_actor(self):
+        env_fn = functools.partial(_CrashingDungeon, mp.Value("b", False), size=(2, 2), reset_mode="same")
+        num_states = len(Dungeon(size=(2, 2)).states)
+        with self.assertRaises(RuntimeError):
+            distributed_qlearning(env_fn, SharedQTable(num_states, 6, alpha=0.1), num_actors=2, num_updates=10 ** 12,
+                                  batch_size=64, time_limit=50, seed=0)
@@ -0,0 +1,199 @@
+from dungeon import Dungeon, _actions, _num_states, decode_states, encode_states
+from dungeon import _EXIT, _LEFT, _DOWN, _RIGHT, _COLLECT, _TOP
+from gdm import DungeonMaps
+from gdm.maps.cache import artifacts
+from gdm.maps.pipeline import stream_maps
+from gdm.rl.tools import Policy
+from unittest import TestCase
+import io
+import re
+import numpy as np
+
+
+class TestStateIndex(TestCase):
+
+    def test_num_states(self):
+        self.assertEqual(_num_states((3, 2)), 6 ** 3)
+        self.assertEqual(len(Dungeon(size=(3, 2)).states), 6 ** 3)
+
+    def test_round_trip(self):
+        size = (3, 2)
+        codes = np.arange(_num_states(size))
+        self.assertTrue(np.array_equal(encode_states(*decode_states(codes, size), size=size), codes))
+
+    def test_validity(self):
+        size = (2, 3)
+        agent, treasure, exit_location, collected = decode_states(np.arange(_num_states(size)), size)
+        for locations in (agent, treasure, exit_location):
+            self.assertTrue(np.all((0 <= locations) & (locations < 6)))
+        # the treasure is on the agent once collected, and never on the exit before
+        self.assertTrue(np.all(treasure[collected] == agent[collected]))
+        self.assertTrue(np.all(treasure[~collected] != exit_location[~collected]))
+        keys = set(zip(agent.tolist(), treasure.tolist(), exit_location.tolist(), collected.tolist()))
+        self.assertEqual(len(keys), _num_states(size))
+
+    def test_large_map(self):
+        dungeon = Dungeon(size=(12, 11))
+        for action in ["right", "down", "left", "top"] * 5:
+            state, _, _, _ = dungeon.step(action)
+            self.assertIn(state["code"], dungeon.states)
+            self.assertEqual(dungeon.states[state["code"]], state)
+            self.assertEqual(dungeon.states.index(state), state["code"])
+
+
+class TestLegalActions(TestCase):
+
+    def setUp(self) -> None:
+        self.dungeon = Dungeon(DungeonMaps(size=(4, 5), seed=0), reset_mode="same")
+
+    def test_legal_moves(self):
+        blocked = self.dungeon._map.blocked_moves()
+        n, m = self.dungeon._map.size
+        for x in range(n):
+            for y in range(m):
+                self.dungeon._current_location = (x, y)
+                mask = self.dungeon.action_mask()
+                self.assertEqual([mask[code] for code in (_TOP, _DOWN, _LEFT, _RIGHT)],
+                                 (~blocked[x, y]).tolist())
+                self.assertTrue(mask[_COLLECT] and not mask[_EXIT])
+        self.dungeon._collected = True
+        self.assertTrue(self.dungeon.action_mask()[_EXIT] and not self.dungeon.action_mask()[_COLLECT])
+
+    def test_state_masks(self):
+        codes = np.arange(len(self.dungeon.states))
+        masks = self.dungeon.action_mask(codes)
+        for code in np.random.default_rng(0).choice(codes, 50).tolist():
+            state = self.dungeon.states[code]
+            self.dungeon._current_location = state["agent_location"]
+            self.dungeon._collected = bool(state["treasure_collected"])
+            self.assertEqual(masks[code].tolist(), self.dungeon.action_mask().tolist())
+
+    def test_illegal_action(self):
+        for code in np.flatnonzero(~self.dungeon.action_mask()).tolist():
+            self.dungeon.reset()
+            state, reward, done = self.dungeon.fast_step(code)
+            self.assertEqual((state, reward, done), (self.dungeon.reset(), -10., False))
+
+    def test_masked_policy(self):
+        policy = Policy(0.5, np.random.default_rng(0).random((len(self.dungeon.states), 6)),
+                        action_mask=self.dungeon.action_mask)
+        state = self.dungeon.reset()
+        for _ in range(100):
+            action = policy(state)
+            self.assertTrue(self.dungeon.action_mask()[action])
+            state, _, done = self.dungeon.fast_step(action)
+            if done:
+                state = self.dungeon.reset()
+
+
+class TestArtifacts(TestCase):
+
+    def test_new_maps_bypass_cache(self):
+        dungeon = Dungeon(DungeonMaps(size=(3, 4), seed=0), reset_mode="new")
+        entries = len(artifacts)
+        for _ in range(5):
+            dungeon.reset()
+            str(dungeon)
+        self.assertEqual(len(artifacts), entries)
+
+    def test_given_map_cached(self):
+        _map = DungeonMaps(size=(3, 5), seed=1)
+        first = Dungeon(_map, reset_mode="same")
+        second = Dungeon(_map, reset_mode="same")
+        self.assertIs(first._legal_moves, second._legal_moves)
+
+
+class TestResetModes(TestCase):
+
+    def _maps(self, mode: str, num_resets: int, seed=None) -> list:
+        dungeon = Dungeon(DungeonMaps(size=(3, 3), seed=0), reset_mode=mode, seed=seed, pool_size=4)
+        try:
+            maps = []
+            for _ in range(num_resets):
+                state = dungeon.reset()
+                self.assertEqual(state, dungeon.state["code"])
+                self.assertEqual(dungeon._fast_legal_moves, dungeon._legal_moves.ravel().tolist())
+                next_states, rewards, dones = dungeon.transition_model()
+                action = int(np.argmax(dungeon.action_mask()))
+                self.assertEqual(dungeon.fast_step(action),
+                                 (next_states[state, action], rewards[state, action], dones[state, action]))
+                maps.append(dungeon._map)
+            self.stats = dungeon.reset_stats()
+        finally:
+            dungeon.close()
+        return maps
+
+    def test_sequence(self):
+        maps_1, maps_2 = self._maps("sequence", 6, seed=5), self._maps("sequence", 6, seed=5)
+        expected = stream_maps(size=(3, 3), seed=5, num_maps=6)
+        for map_1, map_2, map_3 in zip(maps_1, maps_2, expected):
+            self.assertTrue(np.array_equal(map_1._grid, map_2._grid))
+            self.assertTrue(np.array_equal(map_1._grid, map_3._grid))
+        self.assertEqual(self.stats["sequence"]["hits"] + self.stats["sequence"]["misses"], 6)
+
+    def test_pool(self):
+        maps = self._maps("pool", 6)
+        self.assertEqual(len(set(map(id, maps))), 6)
+        self.assertEqual(self.stats["same"], {"hits": 1, "misses": 0})
+        self.assertEqual(self.stats["new"], {"hits": 0, "misses": 0})
+        self.assertEqual(self.stats["pool"]["hits"] + self.stats["pool"]["misses"], 6)
+
+
+class TestRender(TestCase):
+
+    def test_render(self):
+        dungeon = Dungeon(DungeonMaps(size=(3, 4), seed=0), reset_mode="same")
+        stream = io.StringIO()
+        dungeon.render(stream=stream)
+        self.assertEqual(stream.getvalue(), str(dungeon) + "\n")
+        self.assertEqual(str(dungeon).count("#"), 1)
+
+    def test_ansi_diff(self):
+        dungeon = Dungeon(DungeonMaps(size=(3, 4), seed=0), reset_mode="same")
+        stream = io.StringIO()
+        dungeon.render(ansi=True, stream=stream)
+        self.assertTrue(stream.getvalue().startswith("\x1b[H\x1b[2J"))
+        (x_1, y_1), action = dungeon._current_location, _actions[int(np.flatnonzero(dungeon.action_mask())[0])]
+        dungeon.step(action)
+        x_2, y_2 = dungeon._current_location
+        stream = io.StringIO()
+        dungeon.render(ansi=True, stream=stream)
+        # one escape sequence per changed cell, on the terminal row i + 1 and column 4 * j + 1 of the frame cell (i, j)
+        cells = {(int(row), int(column), char) for row, column, char in
+                 re.findall(r"\x1b\[(\d+);(\d+)H([^\x1b])", stream.getvalue())}
+        if (x_1, y_1) == (x_2, y_2):
+            self.assertEqual(cells, set())
+        else:
+            self.assertEqual({(row, column) for row, column, _ in cells},
+                             {(2 * x + 2, 4 * 2 * (2 * y + 1) + 1) for x, y in ((x_1, y_1), (x_2, y_2))})
+            self.assertIn((2 * x_2 + 2, 4 * 2 * (2 * y_2 + 1) + 1, "#"), cells)
+
+
+class TestFastStep(TestCase):
+
+    def test_rules(self):
+        # the rewards and transitions of 'fast_step' follow the transition model
+        rng = np.random.default_rng(0)
+        for seed in range(20):
+            size = tuple(rng.integers(2, 6, 2).tolist())
+            dungeon = Dungeon(DungeonMaps(size=size, seed=seed), reset_mode="same")
+            next_states, rewards, dones = dungeon.transition_model()
+            state = dungeon.reset()
+            for _ in range(200):
+                action = int(rng.integers(len(_actions)))
+                next_state, reward, done = dungeon.fast_step(action)
+                self.assertEqual((type(reward), type(next_state)), (float, int))
+                self.assertEqual((next_state, reward, done),
+                                 (next_states[state, action], rewards[state, action], dones[state, action]))
+                self.assertEqual(dungeon.state["code"], next_state)
+                state = dungeon.reset() if done else next_state
+
+    def test_step(self):
+        dungeon_1 = Dungeon(DungeonMaps(size=(4, 4), seed=0), reset_mode="same")
+        dungeon_2 = Dungeon(dungeon_1._map, reset_mode="same")
+        for code in np.random.default_rng(0).integers(0, len(_actions), 100).tolist():
+            state, reward, done, info = dungeon_1.step(_actions[code])
+            self.assertEqual((state["code"], reward, done), dungeon_2.fast_step(code))
+            self.assertEqual(info, {})
+            if done:
+                break
@@ -0,0 +1,46 @@
+from dungeon import Dungeon, _actions
+from gdm import DungeonMaps
+from model import CSRMatrix, export_model
+from unittest import TestCase
+import numpy as np
+
+
+class TestModel(TestCase):
+
+    def setUp(self) -> None:
+        self.map = DungeonMaps(size=(3, 3), seed=0)
+        self.model = export_model(self.map)
+
+    def test_cached(self):
+        self.assertIs(export_model(self.map), self.model)
+
+    def test_transition_model(self):
+        next_states, rewards, dones = Dungeon(self.map, reset_mode="same").transition_model()
+        self.assertTrue(np.array_equal(self.model.rewards, rewards))
+        self.assertTrue(np.array_equal(self.model.dones, dones))
+        for action, matrix in enumerate(self.model.transitions):
+            array = matrix.toarray()
+            # deterministic transitions, none out of the episode ends
+            self.assertTrue(np.array_equal(array.sum(axis=1), ~dones[:, action]))
+            rows = np.flatnonzero(~dones[:, action])
+            self.assertTrue(np.array_equal(array[rows].argmax(axis=1), next_states[rows, action]))
+
+    def test_step(self):
+        dungeon = Dungeon(self.map, reset_mode="same")
+        rng = np.random.default_rng(0)
+        state = dungeon.reset()
+        for _ in range(200):
+            action = int(rng.integers(len(_actions)))
+            next_state, reward, done = dungeon.fast_step(action)
+            self.assertEqual((self.model.rewards[state, action], self.model.dones[state, action]), (reward, done))
+            if done:
+                state = dungeon.reset()
+                continue
+            self.assertEqual(self.model.transitions[action].toarray()[state, next_state], 1)
+            state = next_state
+
+    def test_matmul(self):
+        matrix = CSRMatrix(np.array([0, 2, 2, 3]), np.array([0, 2, 1]), np.array([1., 2., 3.]), (3, 3))
+        vector = np.array([1., 10., 100.])
+        self.assertTrue(np.array_equal(matrix @ vector, matrix.toarray() @ vector))
+        self.assertTrue(np.array_equal(matrix.toarray(), [[1, 0, 2], [0, 0, 0], [0, 3, 0]]))
@@ -0,0 +1,111 @@
+from gdm.rl.methods.persistent import MemmapQTable
+from gdm.rl.methods.qlearning import QTable
+from unittest import TestCase
+import os
+import tempfile
+import numpy as np
+
+
+class _Crash(Exception):
+    pass
+
+
+class TestMemmapQTable(TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self._directory.name, "q.npy")
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def _table(self, resume=False):
+        return MemmapQTable(self.path, 10, 3, alpha=0.5, block_size=4, resume=resume)
+
+    def test_save_load(self):
+        q = QTable(10, 3, alpha=0.5)
+        q[2, 1] = 4.
+        q.save(self.path)
+        loaded = QTable.load(self.path, alpha=0.5)
+        np.testing.assert_array_equal(loaded[:], q[:])
+        with self.assertRaises(ValueError):
+            loaded[0, 0] = 1.
+
+    def test_checkpoint(self):
+        q = self._table()
+        q[1, 0] = 1.
+        q.update_batch(np.array([9, 9]), np.array([2, 2]), np.array([2., 2.]))
+        self.assertEqual(q.num_dirty_blocks, 2)
+        self.assertEqual(q.checkpoint(episode=1), 2)
+        self.assertEqual(q.num_dirty_blocks, 0)
+        self.assertEqual(q.checkpoint(episode=2), 0)
+        self.assertEqual(q.checkpoint_info, {"count": 2, "episode": 2})
+
+    def test_resume(self):
+        q = self._table()
+        q[1, 0] = 1.
+        q[5, 2] = 2.
+        q.checkpoint(episode=3)
+        expected = np.array(q[:])
+        q[1, 0] = 10.
+        q.update_batch(np.array([8]), np.array([1]), np.array([4.]))
+        q.flush()
+        resumed = self._table(resume=True)
+        np.testing.assert_array_equal(resumed[:], expected)
+        self.assertEqual(resumed.checkpoint_info, {"count": 1, "episode": 3})
+        self.assertEqual(resumed.num_dirty_blocks, 0)
+
+    def test_resume_missing(self):
+        with self.assertRaises(FileNotFoundError):
+            self._table(resume=True)
+        q = self._table()
+        q[1, 0] = 1.
+        q.checkpoint()
+        os.remove(self.path + ".json")
+        with self.assertRaises(FileNotFoundError):
+            self._table(resume=True)
+        self.assertEqual(np.load(self.path)[1, 0], 1.)
+
+    def test_resume_shape(self):
+        self._table()
+        with self.assertRaises(ValueError):
+            MemmapQTable(self.path, 11, 3, alpha=0.5, resume=True)
+
+    def test_interrupted_checkpoint(self):
+        q = self._table()
+        q[1, 0] = 1.
+        q.checkpoint()
+        expected = np.array(q[:])
+        q[1, 0] = 2.
+        q[9, 0] = 3.
+
+        def crash(checkpoint_info):
+            raise _Crash
+
+        # the log is written but the checkpoint is not committed
+        q._write_meta = crash
+        with self.assertRaises(_Crash):
+            q.checkpoint()
+        resumed = self._table(resume=True)
+        np.testing.assert_array_equal(resumed[:], expected)
+        self.assertEqual(resumed.checkpoint_info["count"], 1)
+
+    def test_committed_checkpoint(self):
+        q = self._table()
+        q[1, 0] = 1.
+        q[9, 0] = 3.
+        write_meta = q._write_meta
+
+        def crash(checkpoint_info):
+            write_meta(checkpoint_info)
+            raise _Crash
+
+        # the checkpoint is committed but not copied to the checkpoint file
+        q._write_meta = crash
+        with self.assertRaises(_Crash):
+            q.checkpoint()
+        expected = np.array(q[:])
+        q[1, 0] = 5.
+        resumed = self._table(resume=True)
+        np.testing.assert_array_equal(resumed[:], expected)
+        self.assertEqual(resumed.checkpoint_info["count"], 1)
@@ -0,0 +1,36 @@
+from dungeon import Dungeon
+from gdm import DungeonMaps
+from gdm.rl.methods.planning import policy_iteration, value_iteration
+from unittest import TestCase
+import numpy as np
+
+
+class TestPlanning(TestCase):
+
+    def setUp(self) -> None:
+        self.dungeon = Dungeon(DungeonMaps(size=(4, 4), seed=0), reset_mode="same")
+
+    def test_agreement(self):
+        q_1 = value_iteration(self.dungeon)
+        q_2 = policy_iteration(self.dungeon)
+        self.assertTrue(np.allclose(q_1[:], q_2[:], atol=1e-6))
+
+    def test_optimal_rollout(self):
+        for seed in range(5):
+            dungeon = Dungeon(DungeonMaps(size=(4, 4), seed=seed), reset_mode="same")
+            q = value_iteration(dungeon)
+            state, done, steps = dungeon.reset(), False, 0
+            while not done and steps < 100:
+                state, _, done = dungeon.fast_step(int(np.argmax(q[state])))
+                steps += 1
+            self.assertTrue(done)
+            self.assertEqual(steps, dungeon._map.optimal_episode_length())
+
+    def test_discount_rate(self):
+        for planning in (value_iteration, policy_iteration):
+            with self.assertRaises(ValueError):
+                planning(self.dungeon, discount_rate=1.)
+
+    def test_max_iterations(self):
+        q = policy_iteration(self.dungeon, discount_rate=0.99, tol=0., max_iterations=3)
+        self.assertTrue(np.all(np.isfinite(q[:])))
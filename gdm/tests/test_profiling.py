@@ -0,0 +1,59 @@
+from dungeon import Dungeon
+from gdm.maps.dungeonmap import DungeonMaps
+from gdm.profiling import Profiler, Reporter, profiler
+from gdm.rl.methods.qlearning import QTable, qlearning
+from gdm.rl.tools import Policy
+from unittest import TestCase
+import contextlib
+import io
+
+
+class TestProfiler(TestCase):
+
+    def test_disabled(self):
+        _profiler = Profiler()
+        with _profiler.timer("block"):
+            pass
+        _profiler.count("calls")
+        self.assertEqual(_profiler.snapshot()["timers"], {})
+        self.assertEqual(_profiler.snapshot()["counters"], {})
+        self.assertEqual(Reporter(_profiler, interval=0)(), "")
+
+    def test_snapshot(self):
+        _profiler = Profiler()
+        _profiler.enabled = True
+        function = _profiler.profiled("function")(lambda x: x + 1)
+        for episode in range(3):
+            for _ in range(episode + 1):
+                self.assertEqual(function(1), 2)
+                _profiler.count("calls")
+            _profiler.end_episode()
+        snapshot = _profiler.snapshot(bins=3)
+        self.assertEqual(snapshot["episodes"], 3)
+        self.assertEqual(snapshot["timers"]["function"]["count"], 6)
+        self.assertEqual(snapshot["counters"]["calls"]["total"], 6)
+        self.assertEqual(snapshot["counters"]["calls"]["per_episode"]["counts"], [1, 1, 1])
+        self.assertIn("calls=6", Reporter(_profiler, interval=0)())
+
+    def test_map_generation(self):
+        profiler.enabled = True
+        try:
+            DungeonMaps(size=(4, 4))
+            self.assertGreaterEqual(profiler.snapshot()["timers"]["maps.construction"]["count"], 1)
+        finally:
+            profiler.enabled = False
+            profiler.reset()
+
+    def test_qlearning_steps(self):
+        env = Dungeon(DungeonMaps(size=(2, 2), seed=0), reset_mode="same")
+        q = QTable(len(env.states), len(env.actions), alpha=0.1)
+        profiler.enabled = True
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                qlearning(env, q, Policy(0.5, q), num_episodes=3, time_limit=20, eval_frequency=10,
+                          snapshot_frequency=10)
+            snapshot = profiler.snapshot()
+            self.assertEqual(snapshot["timers"]["env.step"]["count"], snapshot["counters"]["qlearning.steps"]["total"])
+        finally:
+            profiler.enabled = False
+            profiler.reset()
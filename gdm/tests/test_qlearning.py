@@ -0,0 +1,123 @@
+from gdm.rl.methods.qlearning import HashedQTable, QTable, batched_qlearning
+from gdm.rl.tools import Policy
+from unittest import TestCase
+import contextlib
+import io
+import numpy as np
+
+
+class _OneStepEnv:
+    """Vectorized environment whose episodes end after one step, reset to state 0 while the terminal state is 2"""
+    num_envs = 1
+
+    def reset(self, envs=None):
+        return np.array([0])
+
+    def step(self, actions):
+        return np.array([0]), np.array([1.]), np.array([True]), {"terminal_states": np.array([2])}
+
+
+class TestQTable(TestCase):
+
+    def test_update_batch(self):
+        rng = np.random.default_rng(0)
+        states, actions, targets = rng.integers(0, 4, 200), rng.integers(0, 3, 200), rng.normal(size=200)
+        sequential, batched = QTable(4, 3, alpha=0.3), QTable(4, 3, alpha=0.3)
+        sequential._table[:] = batched._table[:] = rng.normal(size=(4, 3))
+        for state, action, target in zip(states, actions, targets):
+            sequential.current_state, sequential.current_action = state, action
+            sequential.update(target)
+        # the 200 updates fold into at most 12 distinct pairs
+        batched.update_batch(states, actions, targets)
+        self.assertTrue(np.allclose(batched._table, sequential._table))
+
+
+class TestHashedQTable(TestCase):
+
+    def _update(self, q, state, action, target):
+        q.current_state, q.current_action = state, action
+        q.update(target)
+
+    def test_update(self):
+        rng = np.random.default_rng(0)
+        dense, hashed = QTable(500, 3, alpha=0.3), HashedQTable(500, 3, alpha=0.3, initial_capacity=8)
+        for state, action, target in zip(rng.integers(0, 500, 2000), rng.integers(0, 3, 2000), rng.random(2000)):
+            self._update(dense, state, action, target)
+            self._update(hashed, state, action, target)
+        np.testing.assert_allclose(hashed[np.arange(500)], dense[:])
+
+    def test_getitem(self):
+        q = HashedQTable(100, 2, alpha=0.5)
+        q[7] = [1., 2.]
+        q[9, 1] = 3.
+        self.assertEqual(q[7].tolist(), [1., 2.])
+        self.assertEqual(q[7, 1], 2.)
+        self.assertEqual(q[np.int64(8)].tolist(), [0., 0.])
+        self.assertEqual(q[np.array([7, 8, 9])].tolist(), [[1., 2.], [0., 0.], [0., 3.]])
+        self.assertEqual(q[np.array([7, 9]), np.array([0, 1])].tolist(), [1., 3.])
+        self.assertEqual(len(q), 2)
+
+    def test_setitem_arrays(self):
+        q = HashedQTable(100, 2, alpha=0.5, initial_capacity=8)
+        q[np.arange(20)] = 1.
+        q[np.array([3, 30]), np.array([1, 0])] = [5., 6.]
+        self.assertEqual(len(q), 21)
+        self.assertEqual(q[np.array([3, 30, 19])].tolist(), [[1., 5.], [6., 0.], [1., 1.]])
+        with self.assertRaises(TypeError):
+            q[:] = 0.
+
+    def test_growth(self):
+        q = HashedQTable(1000, 2, alpha=0.5, initial_capacity=8, max_load=0.5)
+        for state in range(100):
+            q[state, 0] = state
+        self.assertEqual(q.capacity, 256)
+        self.assertLessEqual(q.stats()["load"], 0.5)
+        self.assertEqual(q[np.arange(100), 0].tolist(), list(range(100)))
+        self.assertEqual(q.evictions, 0)
+
+    def test_eviction_order(self):
+        # 32 bytes per slot: 8 slots and 4 rows at most
+        q = HashedQTable(100, 2, alpha=0.5, max_bytes=256, initial_capacity=8, max_load=0.5, evict_fraction=0.5)
+        for state in range(4):
+            q[state, 0] = 1.
+        self._update(q, 0, 1, 1.)
+        q[4, 0] = 1.
+        self.assertEqual(q.evictions, 2)
+        self.assertEqual(len(q), 3)
+        self.assertEqual(q[np.arange(5), 0].tolist(), [1., 0., 0., 1., 1.])
+
+    def test_max_bytes(self):
+        q = HashedQTable(10 ** 6, 6, alpha=0.5, max_bytes=1 << 16, initial_capacity=8)
+        for state in range(0, 10 ** 6, 997):
+            q[state, 0] = 1.
+        self.assertEqual(q.capacity, q.max_capacity)
+        self.assertLessEqual(q.nbytes, 1 << 16)
+        self.assertGreater(q.evictions, 0)
+
+    def test_max_load(self):
+        for max_load in (0., 1., 1.5):
+            with self.assertRaises(ValueError):
+                HashedQTable(10, 2, alpha=0.5, max_load=max_load)
+
+
+class TestBatchedQLearning(TestCase):
+
+    def test_bootstrap_on_terminal_states(self):
+        q = QTable(3, 2, alpha=0.5)
+        q[2] = 5.
+        with contextlib.redirect_stdout(io.StringIO()):
+            batched_qlearning(_OneStepEnv(), q, Policy(0., q), discount_rate=0.7, num_episodes=1)
+        self.assertAlmostEqual(q[0, 0], 0.5 * (1 + 0.7 * 5))
+        self.assertEqual(q[0, 1], 0.)
+
+
+class TestPolicy(TestCase):
+
+    def test_batch(self):
+        values = np.array([[1., 3., 2.], [3., 1., 2.]])
+        masks = np.array([[True, False, True], [False, True, True]])
+        policy = Policy(0., values, action_mask=lambda states: masks[states])
+        self.assertEqual(policy.batch(np.array([0, 1, 0])).tolist(), [2, 2, 2])
+        policy.epsilon = 1.
+        actions = policy.batch(np.zeros(100, dtype=int))
+        self.assertEqual(set(actions.tolist()), {0, 2})
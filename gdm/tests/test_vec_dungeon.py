@@ -0,0 +1,35 @@
+from dungeon import Dungeon
+from gdm import DungeonMaps
+from gdm.maps.packed import PackedWalls
+from vec_dungeon import VecDungeon
+from unittest import TestCase
+import numpy as np
+
+
+class TestVecDungeon(TestCase):
+
+    def test_step(self):
+        # the first maps of the vectorized dungeon are the first batch drawn from its generator
+        size, num_envs = (4, 5), 8
+        envs = VecDungeon(num_envs, size, seed=0)
+        grids, keypoints = DungeonMaps.generate(num_envs, size, seed=np.random.default_rng(0))
+        dungeons = [Dungeon(DungeonMaps.from_packed(PackedWalls.from_grid(grid), points), reset_mode="same")
+                    for grid, points in zip(grids, keypoints)]
+        self.assertEqual(envs.states.tolist(), [dungeon.reset() for dungeon in dungeons])
+        rng = np.random.default_rng(1)
+        running = np.ones(num_envs, dtype=bool)
+        for _ in range(200):
+            actions = rng.integers(0, 6, num_envs)
+            _, rewards, dones, info = envs.step(actions)
+            for i in np.flatnonzero(running):
+                state, reward, done = dungeons[i].fast_step(int(actions[i]))
+                self.assertEqual((info["terminal_states"][i], rewards[i], dones[i]), (state, reward, done))
+            # the finished dungeons restart on new maps
+            running &= ~dones
+
+    def test_reset(self):
+        envs = VecDungeon(4, (3, 3), seed=0)
+        envs.step(np.full(4, 4))
+        states = envs.reset([1])
+        self.assertEqual(states.shape, (4, ))
+        self.assertEqual(envs._time.tolist(), [1, 0, 1, 1])